@@ -0,0 +1,118 @@
+import asyncio
+import codecs
+import os
+import stat
+import sys
+from Lexer import StreamLexer
+
+# lexer front end for live input: every stream is read as bytes arrive and its
+# tokens come out of an async iterator, so one event loop can follow any number
+# of performers' pipes or sockets at once
+
+async def aiter_tokens(reader, chunk_size=4096, encoding='utf-8'):
+    """yield the tokens of an asyncio StreamReader as its bytes arrive
+    
+    a token is published as soon as the character after it has arrived (a
+    space or newline is enough), since until then it might still grow
+    """
+    stream = StreamLexer()
+    decoder = codecs.getincrementaldecoder(encoding)('replace')
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        # the decoder keeps a multi-byte character split across reads
+        for token in stream.feed(decoder.decode(data)):
+            yield token
+    for token in stream.feed(decoder.decode(b'', final=True), final=True):
+        yield token
+
+# tasks feeding readers from regular files, kept referenced until they finish
+_feeders = set()
+
+async def stdin_reader(stream=None, chunk_size=65536):
+    """a StreamReader over standard input (or another open file)
+    
+    terminals, pipes and sockets are read by the event loop. a regular file,
+    as in 'python Main.py --live < score.txt', cannot be, so it is read in a
+    worker thread and fed to the reader chunk by chunk
+    """
+    stream = sys.stdin if stream is None else stream
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    fd = stream.fileno()
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), stream)
+        return reader
+    
+    async def feed():
+        try:
+            while True:
+                data = await loop.run_in_executor(None, os.read, fd, chunk_size)
+                if not data:
+                    break
+                reader.feed_data(data)
+        except OSError as error:
+            reader.set_exception(error)
+        else:
+            reader.feed_eof()
+    
+    task = asyncio.create_task(feed())
+    _feeders.add(task)
+    task.add_done_callback(_feeders.discard)
+    return reader
+
+async def merge(sources):
+    """yield (name, token) from several token iterators as tokens become ready
+    
+    sources maps a name to an async iterator such as aiter_tokens(reader).
+    one stream going quiet never holds back the others
+    """
+    queue = asyncio.Queue()
+    done = object()
+    
+    async def pump(name, tokens):
+        try:
+            async for token in tokens:
+                await queue.put((name, token))
+        finally:
+            await queue.put((name, done))
+    
+    tasks = [asyncio.create_task(pump(name, tokens)) for name, tokens in sources.items()]
+    try:
+        running = len(tasks)
+        while running:
+            name, token = await queue.get()
+            if token is done:
+                running -= 1
+            else:
+                yield name, token
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def serve_unix(path, on_token):
+    """lex every connection to a unix socket concurrently until cancelled
+    
+    on_token(client, token) is called for each token, where client numbers
+    the connections in the order they were accepted
+    """
+    clients = 0
+    
+    async def handle(reader, writer):
+        nonlocal clients
+        clients += 1
+        client = clients
+        try:
+            async for token in aiter_tokens(reader):
+                on_token(client, token)
+        finally:
+            writer.close()
+    
+    server = await asyncio.start_unix_server(handle, path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from Lexer import Lexer
+from TokenBuffer import TokenBuffer
+
+# building blocks of the synthetic score
+NOTES = ['c', 'd', 'e', 'f', 'g', 'a', 'b', 'r']
+ACCIDENTALS = ['', '', '', '#', 'b']
+DURATIONS = ['1', '2', '4', '8', '16', '4.']
+SYMBOLS = ['|', '|:', ':|', '#', '~']
+COMMANDS = ['\\tempo=120', '\\function(transpose, c, 2)', 'melody = { c d e }', 'mf', 'pp']
+WORDS = ['melody', 'verse', 'chorus', 'da', 'capo', 'slow', 'down', 'here']
+JUNK = ['$', '@', '?', '!', '^', '&', '%', '"']
+
+def note_part(rng):
+    return rng.choice(NOTES) + rng.choice(ACCIDENTALS) + ' ' + rng.choice(DURATIONS)
+
+def repeat_part(rng):
+    return '|: ' + ' '.join(note_part(rng) for _ in range(rng.randint(1, 4))) + ' :|'
+
+def comment_part(rng):
+    return '// ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) + '\n'
+
+# kind -> (share of the mixed score, part generator)
+KINDS = {
+    'notes': (0.55, note_part),
+    'symbols': (0.15, lambda rng: rng.choice(SYMBOLS)),
+    'repeats': (0.08, repeat_part),
+    'commands': (0.1, lambda rng: rng.choice(COMMANDS)),
+    'comments': (0.07, comment_part),
+    'junk': (0.05, lambda rng: rng.choice(JUNK)),
+}
+
+def iter_score(size, seed=0, kinds=None, block=1 << 16):
+    """yield a reproducible score of roughly size characters in blocks
+    
+    kinds restricts the parts to some of KINDS, for scores of one kind of
+    token; by default all kinds are mixed in their usual shares
+    """
+    rng = random.Random(seed)
+    names = list(kinds or KINDS)
+    weights = [KINDS[name][0] for name in names]
+    makers = [KINDS[name][1] for name in names]
+    length = 0
+    while length < size:
+        parts = []
+        produced = 0
+        while produced < block and length + produced < size:
+            part = rng.choices(makers, weights)[0](rng)
+            # break lines every so often, as real scores do
+            if rng.random() < 0.1:
+                part += '\n'
+            parts.append(part)
+            produced += len(part) + 1
+        parts.append('')
+        yield ' '.join(parts)
+        length += produced
+
+def generate_score(size, seed=0, kinds=None):
+    """build a reproducible score of roughly size characters"""
+    return ''.join(iter_score(size, seed, kinds))
+
+def write_score(path, size, seed=0, kinds=None):
+    """write a score to path without holding all of it in memory"""
+    with open(path, 'w') as f:
+        for block in iter_score(size, seed, kinds):
+            f.write(block)
+
+def measure(tokenize, text, repeats=3):
+    """return (token count, best tokens/sec) over a few runs"""
+    best = None
+    count = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        count = len(tokenize(text))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, count / best
+
+def peak_memory(tokenize, text):
+    """return (token count, peak traced bytes) while the tokens are alive"""
+    tracemalloc.start()
+    tokens = tokenize(text)
+    count = len(tokens)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del tokens
+    return count, peak
+
+def compare_memory(size):
+    """compare peak memory of a token list against a TokenBuffer"""
+    text = generate_score(size)
+    print(f"synthetic score: {len(text)} characters")
+    modes = [
+        ("Token list", lambda t: Lexer(t).tokenize_regex()),
+        ("TokenBuffer", TokenBuffer.from_text),
+    ]
+    for name, tokenize in modes:
+        count, peak = peak_memory(tokenize, text)
+        print(f"{name:>15}: {count} tokens, peak {peak / 2**20:.1f} MiB ({peak / count:.1f} bytes/token)")
+
+def compare_modes(size):
+    """compare the char-by-char and master-pattern tokenizers"""
+    text = generate_score(size)
+    print(f"synthetic score: {len(text)} characters")
+    
+    modes = [
+        ("char-by-char", lambda t: Lexer(t).tokenize()),
+        ("master pattern", lambda t: Lexer(t).tokenize_regex()),
+    ]
+    results = {}
+    for name, tokenize in modes:
+        count, rate = measure(tokenize, text)
+        results[name] = rate
+        print(f"{name:>15}: {count} tokens, {rate:,.0f} tokens/sec")
+    
+    print(f"speedup: {results['master pattern'] / results['char-by-char']:.1f}x")
+
+# --- benchmark suite ---
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARSER_LAB = os.path.join(HERE, '..', '6-parser-ast-build')
+
+# name -> (directory to run in, whether it builds a full token list, setup code).
+# the setup defines load(path) and lex(data) -> token count. every lexer runs in
+# its own process: both labs have top-level Tokens and Main modules, and a fresh
+# process also gives a clean peak memory reading
+LEXERS = {
+    'lab3-char': (HERE, True, """
+from Lexer import Lexer
+load = read_text
+lex = lambda text: len(Lexer(text).tokenize())
+"""),
+    'lab3-regex': (HERE, True, """
+from Lexer import Lexer
+load = read_text
+lex = lambda text: len(Lexer(text).tokenize_regex())
+"""),
+    'lab3-stream': (HERE, False, """
+from Lexer import iter_tokens
+load = lambda path: path
+def lex(path):
+    with open(path) as f:
+        return sum(1 for _ in iter_tokens(f))
+"""),
+    'lab3-mmap': (HERE, False, """
+from TokenBuffer import TokenBuffer
+load = lambda path: path
+lex = lambda path: len(TokenBuffer.from_file(path))
+"""),
+    'lab6': (PARSER_LAB, True, """
+from Main import Lexer
+load = read_text
+lex = lambda text: len(Lexer(text).scan_tokens())
+"""),
+}
+
+WORKER = """
+import contextlib, json, os, resource, sys, time
+def read_text(path):
+    with open(path) as f:
+        return f.read()
+{setup}
+data = load(sys.argv[1])
+min_time = float(sys.argv[2])
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+best = None
+total = 0.0
+# the lab 6 lexer prints a warning for every unexpected character
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    while total < min_time or best is None:
+        start = time.perf_counter()
+        count = lex(data)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        best = elapsed if best is None else min(best, elapsed)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+print(json.dumps({{'tokens': count, 'seconds': best, 'peak_kib': peak}}))
+"""
+
+def run_lexer(name, path, min_time=0.5):
+    """lex the score at path in a fresh process; returns the worker's measurements"""
+    directory, _, setup = LEXERS[name]
+    code = WORKER.format(setup=setup)
+    output = subprocess.run([sys.executable, '-c', code, os.path.abspath(path), str(min_time)],
+                            cwd=directory, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+def parse_size(text):
+    """'1KB', '1MB', '100MB' or a plain number of characters"""
+    units = {'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3}
+    text = text.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def run_suite(sizes, lexers, seed=0, max_list_size=10 ** 7, kind_size=200_000, log=None):
+    """benchmark every lexer on mixed scores of each size and on single-kind scores
+    
+    lexers that build a whole token list are skipped above max_list_size,
+    where the list would no longer fit in memory. time per token type is
+    taken from scores that contain one kind of part only
+    """
+    log = log or (lambda message: print(message, file=sys.stderr))
+    results = []
+    per_kind = {name: {} for name in lexers}  # lexer -> kind -> timings
+    with tempfile.TemporaryDirectory() as directory:
+        for label, size in sizes:
+            path = os.path.join(directory, f'score-{label}.txt')
+            write_score(path, size, seed)
+            for name in lexers:
+                entry = {'lexer': name, 'size': label, 'bytes': os.path.getsize(path)}
+                if LEXERS[name][1] and size > max_list_size:
+                    entry['skipped'] = 'builds a full token list'
+                else:
+                    measured = run_lexer(name, path, min_time=0.5 if size < 10 ** 7 else 0)
+                    entry['peak_mib'] = measured.pop('peak_kib') / 1024
+                    entry.update(measured)
+                    entry['tokens_per_sec'] = measured['tokens'] / measured['seconds']
+                results.append(entry)
+                log(format_entry(entry))
+        
+        for kind in KINDS:
+            path = os.path.join(directory, f'kind-{kind}.txt')
+            write_score(path, kind_size, seed, kinds=[kind])
+            size = os.path.getsize(path)
+            for name in lexers:
+                measured = run_lexer(name, path)
+                # comments (and junk, for lexers that drop it) leave few tokens, so
+                # the time per byte is the comparable figure there
+                per_kind[name][kind] = {
+                    'tokens': measured['tokens'],
+                    'ns_per_token': measured['seconds'] / measured['tokens'] * 1e9,
+                    'ns_per_byte': measured['seconds'] / size * 1e9,
+                }
+            log(f"{kind:>10}: " + ", ".join(
+                f"{name} {per_kind[name][kind]['ns_per_token']:,.0f} ns/token"
+                f" {per_kind[name][kind]['ns_per_byte']:,.0f} ns/byte" for name in lexers))
+    
+    return {
+        'seed': seed,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+        'by_kind': per_kind,
+    }
+
+def format_entry(entry):
+    if 'skipped' in entry:
+        return f"{entry['size']:>6} {entry['lexer']:<12} skipped: {entry['skipped']}"
+    return (f"{entry['size']:>6} {entry['lexer']:<12} {entry['tokens']:>10} tokens "
+            f"{entry['tokens_per_sec']:>12,.0f} tokens/sec  peak +{entry['peak_mib']:.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description="lexer benchmarks")
+    parser.add_argument("size", nargs="?", type=int, default=1_000_000,
+                        help="characters of synthetic score for the mode comparison")
+    parser.add_argument("--memory", nargs="?", type=int, const=2_420_000, metavar="SIZE",
+                        help="compare token list and TokenBuffer memory (default about 1M tokens)")
+    parser.add_argument("--suite", action="store_true",
+                        help="run the throughput suite of both labs' lexers")
+    parser.add_argument("--sizes", default="1KB,1MB,100MB", help="suite score sizes")
+    parser.add_argument("--lexers", default=",".join(LEXERS), help="suite lexers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json", help="where the suite writes its JSON")
+    args = parser.parse_args()
+    
+    if args.memory:
+        compare_memory(args.memory)
+    elif args.suite:
+        sizes = [(label.strip(), parse_size(label)) for label in args.sizes.split(",")]
+        report = run_suite(sizes, args.lexers.split(","), args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}", file=sys.stderr)
+    else:
+        compare_modes(args.size)
+
+if __name__ == "__main__":
+    main()
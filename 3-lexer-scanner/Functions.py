@@ -1,16 +1,31 @@
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # only the batch functions need numpy
+    np = None
+
+from Tokens import TokenType
+
+# pitch classes, built once instead of on every call
+NOTE_NAMES = ['c', 'c#', 'd', 'd#', 'e', 'f', 'f#', 'g', 'g#', 'a', 'a#', 'b']
+NOTE_INDEX = {name: i for i, name in enumerate(NOTE_NAMES)}
+
+# frequency in Hz of every MIDI note number, with a4 (note 69) at 440hz
+MIDI_FREQUENCIES = [440 * (2 ** ((note - 69) / 12)) for note in range(128)]
+
 class MusicFunctions:
     """class that provides special function handling for music notation"""
     
     @staticmethod
     def transpose(note, semitones):
         """transpose a note by given number of semitones"""
-        notes = ['c', 'c#', 'd', 'd#', 'e', 'f', 'f#', 'g', 'g#', 'a', 'a#', 'b']
-        if note.lower() not in notes:
+        idx = NOTE_INDEX.get(note.lower())
+        if idx is None:
             raise ValueError(f"Invalid note: {note}")
         
-        idx = notes.index(note.lower())
         new_idx = (idx + semitones) % 12
-        return notes[new_idx]
+        return NOTE_NAMES[new_idx]
     
     @staticmethod
     def tempo_variation(base_tempo, factor):
@@ -20,43 +35,189 @@ class MusicFunctions:
     @staticmethod
     def frequency(note, octave=4):
         """calculate frequency in Hz for a given note and octave"""
-        # a4 is 440hz
-        notes = {'c': -9, 'c#': -8, 'd': -7, 'd#': -6, 'e': -5, 
-                 'f': -4, 'f#': -3, 'g': -2, 'g#': -1, 'a': 0, 
-                 'a#': 1, 'b': 2}
-        
-        if note.lower() not in notes:
+        idx = NOTE_INDEX.get(note.lower())
+        if idx is None:
             raise ValueError(f"Invalid note: {note}")
         
-        # Calculate semitones from a4
-        n = notes[note.lower()] + (octave - 4) * 12
+        # Calculate semitones from a4, which is 440hz
+        n = idx - 9 + (octave - 4) * 12
         
         # Calculate frequency using standard formula: f = 440 * 2^(n/12)
         return 440 * (2 ** (n / 12))
 
+def require_numpy():
+    """raise a helpful error if the batch functions are used without numpy"""
+    if np is None:
+        raise ImportError("the batch music functions need numpy (pip install numpy)")
+
+def transpose_many(pitch_classes, semitones, octaves=None):
+    """transpose an array of pitch classes (0 = c ... 11 = b) in one operation
+    
+    with octaves given, notes carry into the next octave and a
+    (pitch_classes, octaves) pair of arrays is returned
+    """
+    require_numpy()
+    pitch_classes = np.asarray(pitch_classes, dtype=np.int64)
+    if octaves is None:
+        return (pitch_classes + semitones) % 12
+    midi = (np.asarray(octaves, dtype=np.int64) + 1) * 12 + pitch_classes + semitones
+    return midi % 12, midi // 12 - 1
+
+def frequency_many(pitch_classes, octaves=4):
+    """look up the frequency in Hz of arrays of pitch classes and octaves"""
+    require_numpy()
+    midi = (np.asarray(octaves, dtype=np.int64) + 1) * 12 + np.asarray(pitch_classes, dtype=np.int64)
+    if midi.size and (midi.min() < 0 or midi.max() > 127):
+        raise ValueError("note outside the MIDI range 0-127")
+    return FREQUENCY_TABLE[midi]
+
+def pitch_classes_of(tokens):
+    """return the pitch class of every note in a token stream as an array
+    
+    each sharp token directly after a note raises it a semitone. a
+    TokenBuffer over ASCII text is handled with array operations, any other
+    token sequence in one pass
+    """
+    require_numpy()
+    if isinstance(getattr(tokens, 'source', None), str) and tokens.source.isascii():
+        codes = np.frombuffer(tokens.codes, dtype=np.uint8)
+        notes = np.flatnonzero(codes == TokenType.NOTE.value)
+        starts = np.asarray(tokens.starts, dtype=np.int64)[notes]
+        letters = np.frombuffer(tokens.source.encode('ascii'), dtype=np.uint8)[starts]
+        pitch_classes = LETTER_PITCHES[letters | 0x20]  # lowercase the letter
+        
+        # walk the runs of sharps after all notes at once
+        active = np.arange(len(notes))
+        following = notes + 1
+        while active.size:
+            sharp = codes[np.minimum(following, len(codes) - 1)] == TokenType.SHARP.value
+            sharp &= following < len(codes)
+            active = active[sharp]
+            following = following[sharp] + 1
+            pitch_classes[active] += 1
+        return pitch_classes % 12
+    
+    pitch_classes = []
+    raising = False  # inside the run of sharps right after a note
+    for token in tokens:
+        if token.type == TokenType.NOTE:
+            pitch_classes.append(NOTE_INDEX[token.value])
+            raising = True
+        elif token.type == TokenType.SHARP and raising:
+            pitch_classes[-1] += 1
+        else:
+            raising = False
+    return np.asarray(pitch_classes, dtype=np.int64) % 12
+
+if np is not None:
+    FREQUENCY_TABLE = np.array(MIDI_FREQUENCIES)
+    # natural pitch class by lowercase ascii letter
+    LETTER_PITCHES = np.zeros(256, dtype=np.int64)
+    for letter in 'cdefgab':
+        LETTER_PITCHES[ord(letter)] = NOTE_INDEX[letter]
+
+def whole_number(arg):
+    """convert an argument such as '2', 2 or 2.0 to an int"""
+    value = float(arg)
+    if not value.is_integer():
+        raise ValueError(f"expected a whole number, got {arg}")
+    return int(value)
+
+def note_name(arg):
+    """normalize a note argument so 'C' and 'c' share a cache entry"""
+    return str(arg).lower()
+
+# argument converters of every callable function, one per parameter
+SIGNATURES = {
+    'transpose': (note_name, whole_number),
+    'frequency': (note_name, whole_number),
+    'tempo_variation': (float, float),
+}
+
+CACHE_SIZE = 4096
+
+# calls evaluate_calls answered from its own per-batch table
+batch_hits = 0
+
+# function name -> (memoized function, converters), built once at import
+DISPATCH = {name: (lru_cache(maxsize=CACHE_SIZE)(getattr(MusicFunctions, name)), converters)
+            for name, converters in SIGNATURES.items()}
+
 def parse_function_call(command, args):
     """parse and execute a function call from tokens"""
-    if not hasattr(MusicFunctions, command):
+    entry = DISPATCH.get(command)
+    if entry is None:
         return f"Unknown function: {command}"
     
+    func, converters = entry
     try:
-        func = getattr(MusicFunctions, command)
-        # Convert string args to appropriate types when possible
-        parsed_args = []
-        for arg in args:
-            try:
-                # Try to convert to float first
-                parsed_args.append(float(arg))
-            except ValueError:
-                # If not a number, keep as string
-                parsed_args.append(arg)
-        
-        result = func(*parsed_args)
-        return result
+        if len(args) > len(converters):
+            raise TypeError(f"takes at most {len(converters)} arguments ({len(args)} given)")
+        parsed_args = [convert(arg) for convert, arg in zip(converters, args)]
+        return func(*parsed_args)
     except Exception as e:
         return f"Error executing {command}: {str(e)}"
 
+def evaluate_calls(calls):
+    """evaluate a batch of (command, args) pairs, returning the results in order
+    
+    repeated calls are answered from the cache, errors are returned as
+    messages just like parse_function_call does
+    """
+    global batch_hits
+    results = []
+    seen = {}  # raw call -> result, so repeats skip argument conversion too
+    for command, args in calls:
+        key = (command, tuple(args))
+        result = seen.get(key, seen)
+        if result is seen:
+            result = seen[key] = parse_function_call(command, args)
+        else:
+            batch_hits += 1
+        results.append(result)
+    return results
+
+def function_calls_of(tokens):
+    """yield (command, args) for every \\function(name, arg, ...) in a token stream
+    
+    the tokens of an argument are joined, so c# is one argument
+    """
+    tokens = iter(tokens)
+    for token in tokens:
+        if token.type != TokenType.COMMAND or token.value != '\\function':
+            continue
+        token = next(tokens, None)
+        if token is None or token.type != TokenType.LPAREN:
+            continue
+        
+        args = ['']
+        for token in tokens:
+            if token.type in (TokenType.RPAREN, TokenType.EOF):
+                break
+            if token.type == TokenType.COMMA:
+                args.append('')
+            else:
+                args[-1] += str(token.value)
+        if args[0]:
+            yield args[0], args[1:]
+
+def cache_stats():
+    """return the hits, misses and size of the function cache"""
+    stats = {'hits': batch_hits, 'misses': 0, 'size': 0}
+    for func, _ in DISPATCH.values():
+        info = func.cache_info()
+        stats['hits'] += info.hits
+        stats['misses'] += info.misses
+        stats['size'] += info.currsize
+    return stats
+
+def clear_cache():
+    """empty the function cache and reset its counters"""
+    global batch_hits
+    batch_hits = 0
+    for func, _ in DISPATCH.values():
+        func.cache_clear()
+
 def get_available_functions():
     """get a list of available music functions"""
-    return [func for func in dir(MusicFunctions) 
-            if callable(getattr(MusicFunctions, func)) and not func.startswith('_')] 
\ No newline at end of file
+    return sorted(DISPATCH)
@@ -1,52 +1,184 @@
+import mmap
+import re
+from bisect import bisect_right
 from Tokens import Token, TokenType
 
+# bump whenever the token rules change, cached token streams are keyed on it
+LEXER_VERSION = 1
+
+# one alternative per token kind, in the same order tokenize() checks them,
+# so a single finditer() pass yields exactly the tokens of the char-by-char path.
+# whitespace and comments are swallowed by the prefix of the following match,
+# and EOF matches once at the end so trailing whitespace never backtracks
+MASTER_PATTERN = re.compile(r"""
+    (?:\s+|//[^\n]*\n?)*
+    (?:
+        (?P<DURATION>\d+(?:\.\d*)?)
+      | (?P<COMMAND>\\\w*)
+      | (?P<WORD>[^\W\d]\w*)
+      | (?P<SHARP>\#)
+      | (?P<DOT>\.)
+      | (?P<TRIPLET>~)
+      | (?P<PLUS>\+)
+      | (?P<MINUS>-)
+      | (?P<EQUALS>=)
+      | (?P<LPAREN>\()
+      | (?P<RPAREN>\))
+      | (?P<LBRACE>\{)
+      | (?P<RBRACE>\})
+      | (?P<COMMA>,)
+      | (?P<REPEAT_START>\|:)
+      | (?P<BAR>\|)
+      | (?P<REPEAT_END>:\|)
+      | (?P<ERROR>.)
+      | (?P<EOF>\Z)
+    )
+""", re.VERBOSE | re.DOTALL)
+
+# the same rules over raw bytes, for ASCII sources that are never decoded as a
+# whole. \s, \d and \w only match ASCII here, so a non-ASCII byte lexes as ERROR
+BYTES_PATTERN = re.compile(MASTER_PATTERN.pattern.encode('ascii'), re.VERBOSE | re.DOTALL)
+
+# token type of every group that maps straight onto one
+GROUP_TYPES = {name: TokenType[name] for name in MASTER_PATTERN.groupindex if name != 'WORD'}
+
+# lowercased words that are not plain identifiers
+KEYWORDS = {
+    'a': TokenType.NOTE, 'b': TokenType.NOTE, 'c': TokenType.NOTE, 'd': TokenType.NOTE,
+    'e': TokenType.NOTE, 'f': TokenType.NOTE, 'g': TokenType.NOTE,
+    'r': TokenType.REST,
+    'pp': TokenType.DYNAMIC, 'p': TokenType.DYNAMIC, 'mp': TokenType.DYNAMIC,
+    'mf': TokenType.DYNAMIC, 'ff': TokenType.DYNAMIC,
+}
+BYTE_KEYWORDS = {word.encode('ascii'): token_type for word, token_type in KEYWORDS.items()}
+
+def map_file(path):
+    """memory-map a file read-only, so its bytes are paged in as they are lexed"""
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return b''  # an empty file cannot be mapped
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
 class Position:
-    def __init__(self, line, col):
+    __slots__ = ('line', 'col', 'offset')
+    
+    def __init__(self, line, col, offset=-1):
         self.line = line
         self.col = col
+        self.offset = offset  # absolute source offset, -1 if unknown
+    
+    def copy(self):
+        return Position(self.line, self.col, self.offset)
+    
+    def __str__(self):
+        return f"({self.line}:{self.col})"
+
+class LineIndex:
+    """table of line-start offsets that maps a source offset to its position
     
-    def advance(self, char=None):
-        self.col += 1
-        return self
+    the table is only built the first time a position is resolved, so lexing
+    itself never pays for line bookkeeping
+    """
+    def __init__(self, text):
+        self.text = text
+        self._starts = None
+    
+    @property
+    def starts(self):
+        """offsets at which each line begins"""
+        if self._starts is None:
+            text = self.text
+            newline = '\n' if isinstance(text, str) else b'\n'
+            starts = [0]
+            index = text.find(newline)
+            while index != -1:
+                starts.append(index + 1)
+                index = text.find(newline, index + 1)
+            self._starts = starts
+        return self._starts
+    
+    def edited(self, text, offset, deleted, inserted):
+        """return the index of text, this source with an edit applied
+        
+        line starts before the edit are kept and those after it are moved
+        by the change in length (one map over the list, not a python loop),
+        so only the inserted text is searched for newlines. a table that
+        was never built stays unbuilt
+        """
+        lines = LineIndex(text)
+        if self._starts is not None:
+            starts = self._starts
+            newline = '\n' if isinstance(inserted, str) else b'\n'
+            new_starts = starts[:bisect_right(starts, offset)]
+            index = inserted.find(newline)
+            while index != -1:
+                new_starts.append(offset + index + 1)
+                index = inserted.find(newline, index + 1)
+            tail = starts[bisect_right(starts, offset + deleted):]
+            new_starts += map((len(inserted) - deleted).__add__, tail)
+            lines._starts = new_starts
+        return lines
+    
+    def position(self, offset):
+        """return the (line, col) position of the character at offset"""
+        starts = self.starts
+        line = bisect_right(starts, offset)
+        return Position(line, offset - starts[line - 1] + 1)
+
+class SourcePosition:
+    """position kept as a source offset until its line or column is read"""
+    __slots__ = ('lines', 'offset')
     
-    def advance_line(self):
-        self.line += 1
-        self.col = 0
-        return self
+    def __init__(self, lines, offset):
+        self.lines = lines
+        self.offset = offset
+    
+    @property
+    def line(self):
+        return self.lines.position(self.offset).line
+    
+    @property
+    def col(self):
+        return self.lines.position(self.offset).col
     
     def copy(self):
-        return Position(self.line, self.col)
+        return self.lines.position(self.offset)
     
     def __str__(self):
-        return f"({self.line}:{self.col})"
+        return str(self.lines.position(self.offset))
 
 class Lexer:
-    def __init__(self, text):
+    def __init__(self, text, profile=None):
         self.text = text
-        self.pos = Position(1, 0)  # line 1, column 0
+        self.profile = profile  # a LexerProfile filled in by tokenize()
+        self.lines = LineIndex(text)
+        self.offset = -1  # index of current_char in the text
         self.current_char = None
         self.advance()
     
     def advance(self):
         """advance the current character position"""
-        if self.pos.col < len(self.text):
-            self.current_char = self.text[self.pos.col]
-            self.pos.advance()
+        self.offset += 1
+        if self.offset < len(self.text):
+            self.current_char = self.text[self.offset]
         else:
+            self.offset = len(self.text)
             self.current_char = None
     
     def peek(self, n=1):
         """peek n characters ahead without advancing"""
-        peek_pos = self.pos.col + n - 1
+        peek_pos = self.offset + n
         if peek_pos < len(self.text):
             return self.text[peek_pos]
         return None
     
+    def position(self):
+        """return the position of the current character"""
+        return SourcePosition(self.lines, self.offset)
+    
     def skip_whitespace(self):
         """skip whitespace characters"""
         while self.current_char is not None and self.current_char.isspace():
-            if self.current_char == '\n':
-                self.pos.advance_line()
             self.advance()
     
     def skip_comment(self):
@@ -55,43 +187,40 @@ class Lexer:
             self.advance()
         
         if self.current_char == '\n':
-            self.pos.advance_line()
             self.advance()
     
     def collect_number(self):
         """collect a number (integer or float)"""
-        result = ''
+        start = self.offset
         is_float = False
-        start_pos = self.pos.copy()
         
         while self.current_char is not None and (self.current_char.isdigit() or self.current_char == '.'):
             if self.current_char == '.':
                 if is_float:  # second decimal point is not allowed
                     break
                 is_float = True
-            result += self.current_char
             self.advance()
         
+        result = self.text[start:self.offset]
+        start_pos = SourcePosition(self.lines, start)
         if is_float:
             return Token(TokenType.DURATION, float(result), start_pos)
         return Token(TokenType.DURATION, int(result), start_pos)
     
     def collect_identifier(self):
         """collect an identifier or a command"""
-        start_pos = self.pos.copy()
-        result = ''
+        start = self.offset
+        start_pos = self.position()
         
         if self.current_char == '\\':
-            result += self.current_char
             self.advance()
             while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
-                result += self.current_char
                 self.advance()
-            return Token(TokenType.COMMAND, result, start_pos)
+            return Token(TokenType.COMMAND, self.text[start:self.offset], start_pos)
         
         while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
-            result += self.current_char
             self.advance()
+        result = self.text[start:self.offset]
         
         # check for note tokens
         if result.lower() in ['a', 'b', 'c', 'd', 'e', 'f', 'g']:
@@ -107,8 +236,22 @@ class Lexer:
         return Token(TokenType.IDENTIFIER, result, start_pos)
     
     def tokenize(self):
-        """tokenize the input text"""
+        """tokenize the input text
+        
+        a bytes source, such as Lexer.from_file, goes through tokenize_bytes;
+        a profile then sees it as inline time with no routine calls
+        """
+        if not isinstance(self.text, str):
+            if self.profile is None:
+                return self.tokenize_bytes()
+            self.profile.attach(self)
+            tokens = self.tokenize_bytes()
+            self.profile.finish(self, tokens)
+            return tokens
+        
         tokens = []
+        if self.profile is not None:
+            self.profile.attach(self)
         
         while self.current_char is not None:
             # handle whitespace
@@ -132,7 +275,7 @@ class Lexer:
                 continue
             
             # handle special symbols
-            current_pos = self.pos.copy()
+            current_pos = self.position()
             
             if self.current_char == '#':
                 tokens.append(Token(TokenType.SHARP, '#', current_pos))
@@ -173,6 +316,142 @@ class Lexer:
             
             self.advance()
         
-        # add EOF token
-        tokens.append(Token(TokenType.EOF, None, self.pos.copy()))
-        return tokens 
+        # add EOF token, which sits on the last column like before
+        eof_pos = self.lines.position(self.offset)
+        eof_pos.col -= 1
+        tokens.append(Token(TokenType.EOF, None, eof_pos))
+        if self.profile is not None:
+            self.profile.finish(self, tokens)
+        return tokens
+    
+    def tokenize_regex(self):
+        """tokenize the input text in one pass of the compiled master pattern"""
+        if not isinstance(self.text, str):
+            return self.tokenize_bytes()
+        return StreamLexer().feed(self.text, final=True)
+    
+    @classmethod
+    def from_file(cls, path):
+        """lexer over the memory-mapped bytes of an ASCII file"""
+        return cls(map_file(path))
+    
+    def tokenize_bytes(self):
+        """tokenize an ASCII bytes source, such as a mapped file, without decoding it
+        
+        only the matched lexemes are decoded, and positions stay source
+        offsets until they are printed
+        """
+        text = self.text
+        lines = self.lines
+        tokens = []
+        append = tokens.append
+        
+        for match in BYTES_PATTERN.finditer(text):
+            kind = match.lastgroup
+            start = match.start(kind)
+            
+            if kind == 'WORD':
+                value = match.group(kind).decode('ascii')
+                lowered = value.lower()
+                token_type = KEYWORDS.get(lowered)
+                if token_type is None:
+                    token_type = TokenType.IDENTIFIER
+                else:
+                    value = lowered
+            elif kind == 'DURATION':
+                token_type = TokenType.DURATION
+                value = match.group(kind)
+                value = float(value) if b'.' in value else int(value)
+            elif kind == 'EOF':
+                position = lines.position(start)
+                position.col -= 1
+                append(Token(TokenType.EOF, None, position))
+                break
+            else:
+                token_type = GROUP_TYPES[kind]
+                value = match.group(kind).decode('ascii', 'replace')
+            
+            append(Token(token_type, value, SourcePosition(lines, start)))
+        return tokens
+
+class StreamLexer:
+    """master-pattern lexer that is fed the source text in chunks
+    
+    a match touching the end of the buffered text might continue in the next
+    chunk (a number, a word, '|:', ':|' or a '//' comment), so it is held
+    back until more text arrives or the stream is closed
+    """
+    def __init__(self):
+        self.buffer = ''     # held-back tail of the previous chunk
+        self.offset = 0      # absolute offset of buffer[0]
+        self.line = 1
+        self.line_start = 0  # absolute offset where the current line starts
+    
+    def feed(self, chunk, final=False):
+        """lex newly arrived text and return the tokens that are complete"""
+        text = self.buffer + chunk if self.buffer else chunk
+        size = len(text)
+        offset = self.offset
+        line = self.line
+        line_start = self.line_start - offset  # relative to text from here on
+        next_newline = text.find('\n')
+        keep = size
+        tokens = []
+        append = tokens.append
+        
+        for match in MASTER_PATTERN.finditer(text):
+            if not final and match.end() == size:
+                keep = match.start()
+                break
+            
+            kind = match.lastgroup
+            start = match.start(kind)
+            
+            # only look at newlines once a token has moved past one
+            if 0 <= next_newline < start:
+                line += text.count('\n', next_newline, start)
+                line_start = text.rindex('\n', 0, start) + 1
+                next_newline = text.find('\n', start)
+            position = Position(line, start - line_start + 1, offset + start)
+            
+            if kind == 'WORD':
+                value = match.group(kind)
+                lowered = value.lower()
+                token_type = KEYWORDS.get(lowered)
+                if token_type is None:
+                    token_type = TokenType.IDENTIFIER
+                else:
+                    value = lowered
+            elif kind == 'DURATION':
+                token_type = TokenType.DURATION
+                value = match.group(kind)
+                value = float(value) if '.' in value else int(value)
+            elif kind == 'EOF':
+                position.col -= 1
+                append(Token(TokenType.EOF, None, position))
+                break
+            else:
+                token_type = GROUP_TYPES[kind]
+                value = match.group(kind)
+            
+            append(Token(token_type, value, position))
+        
+        self.buffer = text[keep:]
+        self.offset = offset + keep
+        self.line = line
+        self.line_start = line_start + offset
+        return tokens
+    
+    def close(self):
+        """lex whatever is still buffered and finish the stream with EOF"""
+        return self.feed('', final=True)
+
+def iter_tokens(fileobj, chunk_size=65536):
+    """lazily yield the tokens of a text file object read in fixed-size chunks"""
+    stream = StreamLexer()
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield from stream.feed(chunk)
+    yield from stream.close()
@@ -0,0 +1,112 @@
+import json
+import time
+from collections import Counter
+from Tokens import TokenType
+
+# lexer methods that are timed while profiling
+ROUTINES = ('skip_whitespace', 'skip_comment', 'collect_number', 'collect_identifier')
+
+class LexerProfile:
+    """counts and timings gathered while a Lexer tokenizes
+    
+    pass one to Lexer(text, profile=...) and read it after tokenize(). the
+    routines are only wrapped on that lexer instance, so lexing without a
+    profile costs nothing extra. profiling adds a timer call around every
+    routine call, so compare profiled runs with profiled runs
+    """
+    def __init__(self):
+        self.counts = Counter()          # token type -> tokens
+        self.type_bytes = Counter()      # token type -> source bytes of its lexemes
+        self.calls = Counter()           # routine -> calls
+        self.times = Counter()           # routine -> seconds
+        self.routine_bytes = Counter()   # routine -> source bytes consumed
+        self.collected = set()           # token types built by a collect_* routine
+        self.seconds = 0.0
+        self.bytes = 0
+        self._started = None
+    
+    def attach(self, lexer):
+        """start a run: wrap the routines of lexer in timers"""
+        text = lexer.text
+        # characters are bytes unless a str source has non-ASCII characters
+        encoded = isinstance(text, str) and not text.isascii()
+        for name in ROUTINES:
+            setattr(lexer, name, self.timed(lexer, name, getattr(type(lexer), name), encoded))
+        self.bytes += len(text.encode('utf-8')) if encoded else len(text)
+        self._started = time.perf_counter()
+    
+    def timed(self, lexer, name, routine, encoded):
+        def wrapper():
+            start = lexer.offset
+            started = time.perf_counter()
+            token = routine(lexer)
+            self.times[name] += time.perf_counter() - started
+            self.calls[name] += 1
+            if encoded:
+                consumed = len(lexer.text[start:lexer.offset].encode('utf-8'))
+            else:
+                consumed = lexer.offset - start
+            self.routine_bytes[name] += consumed
+            if token is not None:
+                self.type_bytes[token.type] += consumed
+                self.collected.add(token.type)
+            return token
+        return wrapper
+    
+    def finish(self, lexer, tokens):
+        """end a run: count the tokens and put the lexer's own routines back"""
+        self.seconds += time.perf_counter() - self._started
+        for name in ROUTINES:
+            del lexer.__dict__[name]
+        for token in tokens:
+            self.counts[token.type] += 1
+            # symbols are lexed inline, their value is the lexeme itself
+            if token.type not in self.collected and isinstance(token.value, str):
+                self.type_bytes[token.type] += len(token.value.encode('utf-8'))
+    
+    @property
+    def errors(self):
+        return self.counts[TokenType.ERROR]
+    
+    def report(self):
+        """the profile as a dict, ready for json"""
+        tokens = sum(self.counts.values())
+        routine_time = sum(self.times.values())
+        routines = {name: {'calls': self.calls[name],
+                           'seconds': self.times[name],
+                           'bytes': self.routine_bytes[name]} for name in ROUTINES}
+        routines['inline'] = {'calls': None,
+                              'seconds': max(self.seconds - routine_time, 0.0),
+                              'bytes': sum(self.type_bytes[t] for t in self.counts if t not in self.collected)}
+        return {
+            'tokens': tokens,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'tokens_per_second': tokens / self.seconds if self.seconds else None,
+            'bytes_per_second': self.bytes / self.seconds if self.seconds else None,
+            'errors': self.errors,
+            'types': {token_type.name: {'count': count, 'bytes': self.type_bytes[token_type]}
+                      for token_type, count in self.counts.most_common()},
+            'routines': routines,
+        }
+    
+    def to_json(self):
+        """the report as one compact JSON line, an NDJSON record"""
+        return json.dumps(self.report())
+    
+    def format_table(self):
+        """the profile as plain text tables"""
+        report = self.report()
+        lines = [
+            f"{report['tokens']} tokens, {report['bytes']} bytes in {report['seconds']:.3f}s"
+            f" ({report['tokens_per_second'] or 0:,.0f} tokens/sec), {report['errors']} errors",
+            "",
+            f"{'token type':<14}{'count':>10}{'bytes':>12}",
+        ]
+        for name, row in report['types'].items():
+            lines.append(f"{name:<14}{row['count']:>10}{row['bytes']:>12}")
+        lines += ["", f"{'routine':<20}{'calls':>10}{'seconds':>10}{'bytes':>12}"]
+        for name, row in report['routines'].items():
+            calls = '-' if row['calls'] is None else row['calls']
+            lines.append(f"{name:<20}{calls:>10}{row['seconds']:>10.3f}{row['bytes']:>12}")
+        return "\n".join(lines)
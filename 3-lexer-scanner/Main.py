@@ -1,7 +1,15 @@
+import argparse
+import asyncio
+import json
+import struct
 import sys
-from Lexer import Lexer
+from AsyncLexer import aiter_tokens, serve_unix, stdin_reader
+from Lexer import Lexer, iter_tokens
+from LexerProfile import LexerProfile
+from TokenBuffer import TokenBuffer
+from TokenCache import TokenCache
 from Tokens import TokenType
-from Functions import parse_function_call, get_available_functions
+from Functions import evaluate_calls, function_calls_of, get_available_functions
 
 class PrettyPrinter:
     def __init__(self):
@@ -49,21 +57,35 @@ class PrettyPrinter:
             TokenType.EOF: "reset",
             TokenType.ERROR: "red"
         }
+        
+        # don't use colors if not in a terminal; checked once, not per value
+        self.use_colors = sys.stdout.isatty()
+        
+        # the parts of a rendered token that only depend on its type
+        self.type_labels = {}
+        self.value_colors = {}
+        for token_type in TokenType:
+            self.type_labels[token_type] = self.colorize(token_type.name, "bold") + " "
+            color = self.colors.get(self.token_colors.get(token_type, "reset"))
+            self.value_colors[token_type] = color if self.use_colors else ""
     
     def colorize(self, text, color_name="reset"):
         """add color to text if colors available"""
-        if not sys.stdout.isatty():  # don't use colors if not in a terminal
+        if not self.use_colors:
             return text
         color = self.colors.get(color_name, self.colors["reset"])
         return f"{color}{text}{self.colors['reset']}"
     
     def print_token(self, token):
         """pretty print a single token"""
-        color = self.token_colors.get(token.type, "reset")
-        token_str = f"{self.colorize(token.type.name, 'bold')} "
+        token_str = self.type_labels[token.type]
         
         if token.value is not None:
-            token_str += f"'{self.colorize(str(token.value), color)}'"
+            color = self.value_colors[token.type]
+            if color:
+                token_str += f"'{color}{token.value}{self.colors['reset']}'"
+            else:
+                token_str += f"'{token.value}'"
         
         position = ""
         if token.position:
@@ -71,11 +93,25 @@ class PrettyPrinter:
         
         return token_str + position
     
+    def write_lines(self, lines, out=None, block_size=4096):
+        """write lines in blocks of block_size instead of one print() per line"""
+        out = out or sys.stdout
+        block = []
+        for line in lines:
+            block.append(line)
+            if len(block) >= block_size:
+                block.append("")
+                out.write("\n".join(block))
+                block = []
+        if block:
+            block.append("")
+            out.write("\n".join(block))
+    
     def print_tokens(self, tokens, detailed=True):
         """pretty print a list of tokens"""
         if detailed:
-            for i, token in enumerate(tokens):
-                print(f"{i+1:3d}. {self.print_token(token)}")
+            print_token = self.print_token
+            self.write_lines(f"{i:3d}. {print_token(token)}" for i, token in enumerate(tokens, 1))
         else:
             tokens_str = []
             for token in tokens:
@@ -127,6 +163,62 @@ class PrettyPrinter:
                 result.append(self.colorize(str(token.value), color))
         
         print(" ".join(result))
+    
+    def export_ndjson(self, tokens, out=None):
+        """write one uncolored JSON object per token"""
+        dumps = json.dumps
+        self.write_lines((
+            f'{{"type": "{token.type.name}", "value": {dumps(token.value)}, '
+            f'"line": {token.position.line}, "col": {token.position.col}}}'
+            for token in tokens), out)
+    
+    def export_binary(self, tokens, out=None, block_size=1 << 20):
+        """write tokens as compact binary records
+        
+        the stream starts with b'TOKB' and holds one record per token: type
+        code (u8), line (u32), col (u32), has-value flag (u8), value length
+        (u32) and the UTF-8 value text, all little-endian. a token without a
+        value has flag 0 and length 0
+        """
+        out = out or sys.stdout.buffer
+        record = BINARY_RECORD.pack
+        block = bytearray(b'TOKB')
+        for token in tokens:
+            position = token.position
+            if token.value is None:
+                block += record(token.type.value, position.line, position.col, 0, 0)
+            else:
+                value = str(token.value).encode('utf-8')
+                if len(value) > 0xFFFFFFFF:
+                    raise ValueError(f"token value of {len(value)} bytes is too long for a binary record")
+                block += record(token.type.value, position.line, position.col, 1, len(value))
+                block += value
+            if len(block) >= block_size:
+                out.write(block)
+                block = bytearray()
+        out.write(block)
+
+# record header of the binary export: code, line, col, has value, value length
+BINARY_RECORD = struct.Struct('<BIIBI')
+
+def read_binary(data):
+    """yield (type, value, line, col) for each record of a binary export
+    
+    values come back as the text that was written, or None
+    """
+    if data[:4] != b'TOKB':
+        raise ValueError("not a binary token stream")
+    unpack = BINARY_RECORD.unpack_from
+    size = BINARY_RECORD.size
+    pos = 4
+    while pos < len(data):
+        code, line, col, has_value, length = unpack(data, pos)
+        pos += size
+        value = None
+        if has_value:
+            value = bytes(data[pos:pos + length]).decode('utf-8')
+            pos += length
+        yield TokenType(code), value, line, col
 
 def evaluate_simple_expression(tokens):
     """simple evaluator for demonstration purposes"""
@@ -207,12 +299,30 @@ def interactive_mode():
                     else:
                         print(f"Note: {note['pitch']}{mods} (1/{note['duration']})")
             
+            calls = list(function_calls_of(tokens))
+            if calls:
+                print("\nFunction results:")
+                for (command, args), result in zip(calls, evaluate_calls(calls)):
+                    print(f"{command}({', '.join(args)}) = {result}")
+            
         except KeyboardInterrupt:
             print("\nExiting...")
             break
         except Exception as e:
             print(printer.colorize(f"Error: {str(e)}", "red"))
 
+async def live_mode(path=None):
+    """print the tokens of stdin, or of every client of a unix socket, as they arrive"""
+    printer = PrettyPrinter()
+    if path:
+        def show(client, token):
+            print(f"[{client}] {printer.print_token(token)}", flush=True)
+        print(f"listening on {path}", file=sys.stderr)
+        await serve_unix(path, show)
+    else:
+        async for token in aiter_tokens(await stdin_reader()):
+            print(printer.print_token(token), flush=True)
+
 def print_help():
     """print a help message with examples"""
     printer = PrettyPrinter()
@@ -272,22 +382,71 @@ def demo_mode():
 
 def main():
     """main program entry point"""
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--demo":
-            demo_mode()
-        elif sys.argv[1] == "--file" and len(sys.argv) > 2:
-            with open(sys.argv[2], 'r') as f:
-                code = f.read()
-                lexer = Lexer(code)
-                tokens = lexer.tokenize()
-                printer = PrettyPrinter()
-                printer.print_tokens(tokens)
+    parser = argparse.ArgumentParser(description="music notation lexer")
+    parser.add_argument("--demo", action="store_true", help="step through predefined examples")
+    parser.add_argument("--file", help="lex a score file")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="lex --file across this many processes")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="reuse lexed --file tokens stored in this directory")
+    parser.add_argument("--mmap", action="store_true",
+                        help="memory-map an ASCII --file and lex its raw bytes")
+    parser.add_argument("--format", choices=["text", "ndjson", "binary"], default="text",
+                        help="how --file tokens are written to stdout")
+    parser.add_argument("--profile", action="store_true",
+                        help="lex --file or the code char by char and report counts and "
+                             "timings instead of the tokens (one JSON line with --format ndjson)")
+    parser.add_argument("--live", action="store_true",
+                        help="lex standard input as it arrives (a terminal or a pipe)")
+    parser.add_argument("--listen", metavar="SOCKET",
+                        help="lex every client of a unix socket concurrently as input arrives")
+    parser.add_argument("code", nargs="*", help="music code to lex")
+    args = parser.parse_args()
+    
+    if args.demo:
+        demo_mode()
+    elif args.live or args.listen:
+        try:
+            asyncio.run(live_mode(args.listen))
+        except KeyboardInterrupt:
+            print("\nExiting...")
+    elif args.profile:
+        if args.file:
+            with open(args.file, 'r') as f:
+                text = f.read()
         else:
-            code = " ".join(sys.argv[1:])
-            lexer = Lexer(code)
-            tokens = lexer.tokenize()
-            printer = PrettyPrinter()
-            printer.print_tokens(tokens)
+            text = " ".join(args.code)
+        profile = LexerProfile()
+        Lexer(text, profile=profile).tokenize()
+        print(profile.to_json() if args.format == "ndjson" else profile.format_table())
+    elif args.file:
+        printer = PrettyPrinter()
+        output = {
+            "text": printer.print_tokens,
+            "ndjson": printer.export_ndjson,
+            "binary": printer.export_binary,
+        }[args.format]
+        if args.cache:
+            cache = TokenCache(args.cache)
+            output(cache.load(args.file))
+            print(cache.stats(), file=sys.stderr)
+        elif args.mmap:
+            # no read and no decode of the whole file, values decode per token
+            output(TokenBuffer.from_file(args.file))
+        elif args.jobs > 1:
+            # parallel lexing needs the whole text to cut it into chunks
+            with open(args.file, 'r') as f:
+                tokens = TokenBuffer.from_text_parallel(f.read(), args.jobs)
+            output(tokens)
+        else:
+            # stream the file so memory stays flat however large it is
+            with open(args.file, 'r') as f:
+                output(iter_tokens(f))
+    elif args.code:
+        lexer = Lexer(" ".join(args.code))
+        tokens = lexer.tokenize()
+        printer = PrettyPrinter()
+        printer.print_tokens(tokens)
     else:
         interactive_mode()
 
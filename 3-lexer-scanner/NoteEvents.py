@@ -0,0 +1,100 @@
+from itertools import chain
+from Functions import NOTE_INDEX, np, require_numpy
+from TokenBuffer import TYPES_BY_CODE, TokenBuffer
+from Tokens import TokenType
+
+# one record per note or rest. pitch is the pitch class of the letter (-1 for a
+# rest), accidental the number of sharps minus flats, dotted the number of dots
+# and offset the source offset of the note (-1 if the tokens do not carry one)
+if np is not None:
+    NOTE_EVENT = np.dtype([
+        ('pitch', 'i1'),
+        ('accidental', 'i1'),
+        ('duration', 'f4'),
+        ('dotted', 'u1'),
+        ('offset', 'i8'),
+    ])
+
+# the only token types whose value the extractor reads
+VALUED_TYPES = (TokenType.NOTE, TokenType.DURATION)
+
+def token_fields(tokens):
+    """yield (type, value, source offset) for each token of a stream
+    
+    a TokenBuffer is read straight from its arrays, decoding only the
+    values of notes and durations (a note's value is its letter, which is
+    all the extractor needs)
+    """
+    if isinstance(tokens, TokenBuffer) and isinstance(tokens.source, str):
+        source = tokens.source
+        for code, start, end in zip(tokens.codes, tokens.starts, tokens.ends):
+            token_type = TYPES_BY_CODE[code]
+            if token_type == TokenType.NOTE:
+                yield token_type, source[start], start
+            elif token_type == TokenType.DURATION:
+                yield token_type, float(source[start:end]), start
+            else:
+                yield token_type, None, start
+    elif isinstance(tokens, TokenBuffer):
+        value_at = tokens.value_at
+        for i, (code, start) in enumerate(zip(tokens.codes, tokens.starts)):
+            token_type = TYPES_BY_CODE[code]
+            yield token_type, value_at(i) if token_type in VALUED_TYPES else None, start
+    else:
+        for token in tokens:
+            yield token.type, token.value, getattr(token.position, 'offset', -1)
+
+def extract_note_events(tokens, block_size=4096):
+    """turn a token stream into a structured array of NOTE_EVENT records
+    
+    the tokens are read once, so any iterable works, including the
+    generator of iter_tokens. a note takes the sharps, flats, durations
+    and dots that directly follow it, like evaluate_simple_expression;
+    a rest takes durations and dots. the records are written into
+    preallocated blocks of block_size that are joined at the end
+    """
+    require_numpy()
+    blocks = []
+    block = np.empty(block_size, dtype=NOTE_EVENT)
+    count = 0
+    pitch = None  # pitch of the open note, None when no note is open
+    
+    # the trailing None type closes a note left open by a stream without EOF
+    for token_type, value, offset in chain(token_fields(tokens), [(None, None, -1)]):
+        if pitch is not None:
+            if token_type == TokenType.DURATION:
+                duration = value
+                continue
+            if token_type == TokenType.DOT:
+                dotted += 1
+                continue
+            if pitch >= 0 and token_type == TokenType.SHARP:
+                accidental += 1
+                continue
+            if pitch >= 0 and token_type == TokenType.FLAT:
+                accidental -= 1
+                continue
+            
+            # anything else ends the open note
+            if count == block_size:
+                blocks.append(block)
+                block = np.empty(block_size, dtype=NOTE_EVENT)
+                count = 0
+            block[count] = (pitch, accidental, duration, dotted, start)
+            count += 1
+            pitch = None
+        
+        if token_type == TokenType.NOTE or token_type == TokenType.REST:
+            pitch = NOTE_INDEX[value.lower()] if token_type == TokenType.NOTE else -1
+            accidental = 0
+            duration = 4  # default to quarter note
+            dotted = 0
+            start = offset
+    
+    blocks.append(block[:count])
+    return np.concatenate(blocks)
+
+def note_durations(events):
+    """length of every event in whole notes, counting dots"""
+    require_numpy()
+    return (2 - 0.5 ** events['dotted']) / events['duration']
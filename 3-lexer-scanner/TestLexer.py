@@ -1,5 +1,17 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
 import unittest
-from Lexer import Lexer
+import Functions
+from AsyncLexer import aiter_tokens, merge, serve_unix, stdin_reader
+from Lexer import Lexer, LineIndex, iter_tokens
+from LexerProfile import LexerProfile
+from Main import PrettyPrinter, evaluate_simple_expression, read_binary
+from NoteEvents import extract_note_events
+from TokenBuffer import TokenBuffer, lex_chunk
+from TokenCache import TokenCache
 from Tokens import TokenType
 
 class LexerTest(unittest.TestCase):
@@ -99,6 +111,295 @@ class LexerTest(unittest.TestCase):
         self.assertIsNotNone(bar_token)
         self.assertIsNotNone(repeat_start)
         self.assertIsNotNone(repeat_end)
+    
+    def test_regex_mode_matches_char_mode(self):
+        """test that the master-pattern tokenizer yields the same tokens"""
+        sources = [
+            "c d e f g a b",
+            "c# d# f# g# a# bb",
+            "\\tempo=120 \\function(transpose, c, 2)",
+            "c4 | d4 |: e4 f4 :| 4.5.6 mf PP Melody_1 r",
+            "x = { 12 } ~ + - / : $ ",
+            "c d // comment\n\n  e | f\n// last line",
+        ]
+        for source in sources:
+            expected = Lexer(source).tokenize()
+            actual = Lexer(source).tokenize_regex()
+            self.assertEqual(
+                [(t.type, t.value, str(t.position)) for t in actual],
+                [(t.type, t.value, str(t.position)) for t in expected])
+    
+    def test_streaming_chunk_boundaries(self):
+        """test that tokens split across chunks are reassembled"""
+        source = "c4 |: d8 // note\n 120 e :| f# 3.5\n\\tempo=96 mf"
+        expected = [(t.type, t.value, str(t.position)) for t in Lexer(source).tokenize_regex()]
+        for chunk_size in (1, 2, 3, 5, 64):
+            tokens = iter_tokens(io.StringIO(source), chunk_size)
+            self.assertEqual([(t.type, t.value, str(t.position)) for t in tokens], expected)
+    
+    def test_token_buffer_view(self):
+        """test that the compact buffer reads back as the same tokens"""
+        source = "\\tempo=120\nc4. D 8 | r mf 2.5 // done\nmelody"
+        expected = Lexer(source).tokenize_regex()
+        buffer = TokenBuffer.from_text(source)
+        
+        self.assertEqual(len(buffer), len(expected))
+        self.assertEqual(buffer.type_at(0), TokenType.COMMAND)
+        self.assertEqual(buffer[-1].type, TokenType.EOF)
+        self.assertEqual(
+            [(t.type, t.value, str(t.position)) for t in buffer],
+            [(t.type, t.value, str(t.position)) for t in expected])
+    
+    def test_multiline_positions(self):
+        """test that line and column restart on every line"""
+        source = "c d\n  e // comment\n\nf"
+        tokens = Lexer(source).tokenize()
+        
+        self.assertEqual([t.value for t in tokens], ['c', 'd', 'e', 'f', None])
+        self.assertEqual(
+            [(t.position.line, t.position.col) for t in tokens],
+            [(1, 1), (1, 3), (2, 3), (4, 1), (4, 1)])
+    
+    def test_incremental_relex(self):
+        """test that relexing an edit matches lexing the edited text"""
+        source = "c4 | d 12 // tail\ne |: f :|"
+        buffer = TokenBuffer.from_text(source)
+        buffer.lines.starts  # build the line table, so edits carry it over
+        edits = [(5, 0, "#"), (8, 0, "3"), (10, 0, "/"), (0, 2, "mf"), (3, 1, ":"), (len(source), 0, " g"),
+                 (17, 1, " "), (2, 0, "\n|\n"), (12, 8, "\n")]
+        for offset, deleted, inserted in edits:
+            edited = buffer.relex(offset, deleted, inserted)
+            expected = TokenBuffer.from_text(source[:offset] + inserted + source[offset + deleted:])
+            self.assertEqual(edited.source, expected.source)
+            self.assertEqual(edited.lines.starts, expected.lines.starts)
+            self.assertEqual(
+                [(t.type, t.value, str(t.position)) for t in edited],
+                [(t.type, t.value, str(t.position)) for t in expected])
+        
+        # a chain of edits, each relexing the result of the last
+        text = source
+        for offset, deleted, inserted in edits:
+            buffer = buffer.relex(offset, deleted, inserted)
+            text = text[:offset] + inserted + text[offset + deleted:]
+        self.assertEqual(buffer.lines.starts, LineIndex(text).starts)
+        self.assertEqual(
+            [(t.type, t.value, str(t.position)) for t in buffer],
+            [(t.type, t.value, str(t.position)) for t in TokenBuffer.from_text(text)])
+    
+    def test_parallel_matches_serial(self):
+        """test that chunked lexing in worker processes stitches back exactly"""
+        source = "c4 | d // a comment | e\n" * 50 + "f :| 2.5\n\\tempo=90 g"
+        tokens = TokenBuffer.from_text_parallel(source, workers=2, min_chunk=64)
+        self.assertEqual(
+            [(t.type, t.value, str(t.position)) for t in tokens],
+            [(t.type, t.value, str(t.position)) for t in Lexer(source).tokenize()])
+        
+        # workers build arrays of the parent's offset type, so a text over
+        # 4 GiB stitches even though each chunk would fit in 32 bits
+        self.assertEqual(lex_chunk(("c d\n", False, 'Q'))[1].typecode, 'Q')
+    
+    def test_token_cache_round_trip(self):
+        """test that a cache hit returns the tokens of the first lex"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "score.txt")
+            with open(path, 'w') as f:
+                f.write("\\tempo=120\nc d | e 2.5 // done\n")
+            cache = TokenCache(os.path.join(directory, "cache"))
+            
+            first = [(t.type, t.value, str(t.position)) for t in cache.load(path)]
+            second = [(t.type, t.value, str(t.position)) for t in cache.load(path)]
+            
+            self.assertEqual(first, second)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            
+            # a cache hit is backed by the cache file; relexing it copies the tail out
+            edited = cache.load(path).relex(7, 0, "1")
+            self.assertEqual(
+                [(t.type, t.value, str(t.position)) for t in edited],
+                [(t.type, t.value, str(t.position)) for t in TokenBuffer.from_text(edited.source)])
+    
+    def test_ndjson_export(self):
+        """test that the NDJSON export has one uncolored record per token"""
+        tokens = Lexer("c 4.5\n|: mf").tokenize()
+        out = io.StringIO()
+        PrettyPrinter().export_ndjson(tokens, out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        
+        self.assertEqual(len(records), len(tokens))
+        self.assertEqual(records[1], {"type": "DURATION", "value": 4.5, "line": 1, "col": 3})
+        self.assertEqual(records[2]["type"], "REPEAT_START")
+        self.assertIsNone(records[-1]["value"])
+    
+    def test_binary_export_round_trip(self):
+        """test that binary records read back as the tokens, long values included"""
+        source = "c 4.5\n|: mf " + "x" * 65535 + " " + "y" * 70000
+        tokens = Lexer(source).tokenize()
+        out = io.BytesIO()
+        PrettyPrinter().export_binary(tokens, out, block_size=1024)
+        records = list(read_binary(out.getvalue()))
+        
+        self.assertEqual(records, [
+            (t.type, None if t.value is None else str(t.value), t.position.line, t.position.col)
+            for t in tokens])
+        self.assertEqual([len(value or '') for _, value, _, _ in records[-3:]], [65535, 70000, 0])
+        self.assertIsNone(records[-1][1])
+    
+    @unittest.skipIf(Functions.np is None, "numpy is not installed")
+    def test_batch_music_functions(self):
+        """test that the batch music functions agree with the scalar ones"""
+        source = "c# d e## f g a b# | C 4"
+        pitch_classes = Functions.pitch_classes_of(TokenBuffer.from_text(source))
+        
+        self.assertEqual(list(pitch_classes), list(Functions.pitch_classes_of(Lexer(source).tokenize())))
+        self.assertEqual(list(pitch_classes), [1, 2, 6, 5, 7, 9, 0, 0])
+        
+        transposed = Functions.transpose_many(pitch_classes, 5)
+        names = [Functions.MusicFunctions.transpose(Functions.NOTE_NAMES[p], 5) for p in pitch_classes]
+        self.assertEqual([Functions.NOTE_NAMES[p] for p in transposed], names)
+        
+        frequencies = Functions.frequency_many(pitch_classes, 3)
+        for p, frequency in zip(pitch_classes, frequencies):
+            self.assertAlmostEqual(frequency, Functions.MusicFunctions.frequency(Functions.NOTE_NAMES[p], 3))
+    
+    @unittest.skipIf(Functions.np is None, "numpy is not installed")
+    def test_pitch_classes_stray_sharps(self):
+        """test that sharps not attached to a note raise nothing on either path"""
+        expected = {"c | # # d": [0, 2], "# c # | # e": [1, 4], "c## | # d": [2, 2], "d ## r #": [4]}
+        for source, pitch_classes in expected.items():
+            from_buffer = Functions.pitch_classes_of(TokenBuffer.from_text(source))
+            from_tokens = Functions.pitch_classes_of(Lexer(source).tokenize())
+            self.assertEqual(list(from_buffer), pitch_classes, source)
+            self.assertEqual(list(from_tokens), pitch_classes, source)
+    
+    def test_function_dispatch(self):
+        """test typed dispatch, batch evaluation and the call cache"""
+        Functions.clear_cache()
+        tokens = Lexer("\\function(transpose, c#, 2) d \\function(frequency, A, 4)").tokenize()
+        calls = list(Functions.function_calls_of(tokens))
+        self.assertEqual(calls, [('transpose', ['c#', '2']), ('frequency', ['a', '4'])])
+        
+        self.assertEqual(Functions.evaluate_calls(calls + calls), ['d#', 440.0, 'd#', 440.0])
+        self.assertEqual(Functions.parse_function_call('frequency', ['a', 4.0]), 440.0)
+        self.assertEqual(Functions.cache_stats()['misses'], 2)
+        self.assertEqual(Functions.cache_stats()['hits'], 3)
+        self.assertTrue(Functions.parse_function_call('transpose', ['c', '1.5']).startswith("Error"))
+        self.assertEqual(Functions.parse_function_call('nope', []), "Unknown function: nope")
+    
+    @unittest.skipIf(Functions.np is None, "numpy is not installed")
+    def test_note_events(self):
+        """test that the event array matches the simple evaluator"""
+        source = "c# 8 d## e 2 r 16 | b r f"
+        events = extract_note_events(Lexer(source).tokenize(), block_size=2)
+        notes = evaluate_simple_expression(Lexer(source).tokenize())
+        
+        self.assertEqual(len(events), len(notes))
+        self.assertEqual(list(events['pitch']), [0, 2, 4, -1, 11, -1, 5])
+        self.assertEqual(list(events['accidental']), [1, 2, 0, 0, 0, 0, 0])
+        self.assertEqual(list(events['offset']), [0, 5, 9, 13, 20, 22, 24])
+        self.assertEqual(list(events['duration'][:3]), [note['duration'] for note in notes[:3]])
+        self.assertEqual(events.tolist(), extract_note_events(TokenBuffer.from_text(source)).tolist())
+        streamed = extract_note_events(iter_tokens(io.StringIO(source + "\n" + source), chunk_size=5))
+        self.assertEqual(list(streamed['offset']), [0, 5, 9, 13, 20, 22, 24] + [26, 31, 35, 39, 46, 48, 50])
+    
+    def test_mapped_bytes_mode(self):
+        """test that lexing a mapped ASCII file gives the tokens of its text"""
+        source = "\\tempo=120\r\nc# 4. d | // done\nmelody = { e f } :| mf"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "score.txt")
+            with open(path, 'w', newline='') as f:
+                f.write(source)
+            with open(path) as f:
+                expected = [(t.type, t.value, str(t.position)) for t in Lexer(f.read()).tokenize()]
+            
+            lexed = [(t.type, t.value, str(t.position)) for t in Lexer.from_file(path).tokenize_regex()]
+            buffered = [(t.type, t.value, str(t.position)) for t in TokenBuffer.from_file(path)]
+            char_mode = [(t.type, t.value, str(t.position)) for t in Lexer.from_file(path).tokenize()]
+            profile = LexerProfile()
+            profiled = Lexer(Lexer.from_file(path).text, profile=profile).tokenize()
+        
+        self.assertEqual(lexed, expected)
+        self.assertEqual(buffered, expected)
+        self.assertEqual(char_mode, expected)
+        self.assertEqual(sum(profile.counts.values()), len(expected))
+        self.assertEqual(profile.bytes, len(source))
+    
+    def test_profile_counts(self):
+        """test that a profiled run counts every token and byte once"""
+        source = "\\tempo=120 c# 4. // x\nmelody = { e f } :| $ $"
+        profile = LexerProfile()
+        lexer = Lexer(source, profile=profile)
+        tokens = lexer.tokenize()
+        report = profile.report()
+        
+        self.assertEqual(report['tokens'], len(tokens))
+        self.assertEqual(report['errors'], 2)
+        self.assertEqual(report['types']['NOTE']['count'], 3)
+        self.assertEqual(sum(row['bytes'] for row in report['routines'].values()), len(source))
+        self.assertEqual(report['routines']['skip_comment']['calls'], 1)
+        self.assertNotIn('collect_number', vars(lexer))  # routines are restored
+        self.assertEqual(json.loads(profile.to_json()), report)
+        self.assertNotIn('\n', profile.to_json())  # one NDJSON line
+    
+    def test_async_streams(self):
+        """test that async streams lex like the whole text, even when interleaved"""
+        async def lex_streams(parts):
+            readers = {}
+            for name, chunks in parts.items():
+                reader = asyncio.StreamReader()
+                for chunk in chunks:
+                    reader.feed_data(chunk)
+                reader.feed_eof()
+                readers[name] = aiter_tokens(reader, chunk_size=3)
+            return [(name, token) async for name, token in merge(readers)]
+        
+        parts = {'one': [b'c# 4', b'. d', b' // \xc3', b'\xbc\ne'], 'two': [b'|: mf ', b':|']}
+        merged = asyncio.run(lex_streams(parts))
+        
+        for name, chunks in parts.items():
+            expected = Lexer(b''.join(chunks).decode('utf-8')).tokenize()
+            tokens = [token for source, token in merged if source == name]
+            self.assertEqual([(t.type, t.value, str(t.position)) for t in tokens],
+                             [(t.type, t.value, str(t.position)) for t in expected])
+    
+    def test_async_file_and_socket_sources(self):
+        """test stdin redirected from a regular file and a unix socket client"""
+        text = 'c# 4. d // x\n|: mf e 8 :|'
+        expected = [(t.type, t.value, str(t.position)) for t in Lexer(text).tokenize()]
+        
+        async def lex_file(path):
+            with open(path, 'rb') as f:
+                return [token async for token in aiter_tokens(await stdin_reader(f))]
+        
+        async def lex_socket(path):
+            received = []
+            server = asyncio.create_task(serve_unix(path, lambda client, token: received.append(token)))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            _, writer = await asyncio.open_unix_connection(path)
+            writer.write(text.encode('utf-8'))
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+            while len(received) < len(expected):
+                await asyncio.sleep(0.01)
+            server.cancel()
+            try:
+                await server
+            except asyncio.CancelledError:
+                pass
+            return received
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'score.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            tokens = asyncio.run(lex_file(path))
+            self.assertEqual([(t.type, t.value, str(t.position)) for t in tokens], expected)
+            
+            socket_path = os.path.join(directory, 'live.sock')
+            tokens = asyncio.run(asyncio.wait_for(lex_socket(socket_path), 10))
+            self.assertEqual([(t.type, t.value, str(t.position)) for t in tokens], expected)
+            self.assertFalse(os.path.exists(socket_path))
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,250 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+import os
+try:
+    import numpy as np
+except ImportError:  # offsets are then shifted without numpy
+    np = None
+from Lexer import MASTER_PATTERN, BYTES_PATTERN, GROUP_TYPES, KEYWORDS, LineIndex, map_file
+from Tokens import Token, TokenType
+
+# token types indexed by the one-byte code stored in the buffer
+TYPES_BY_CODE = [None] * (max(t.value for t in TokenType) + 1)
+for token_type in TokenType:
+    TYPES_BY_CODE[token_type.value] = token_type
+
+GROUP_CODES = {name: token_type.value for name, token_type in GROUP_TYPES.items()}
+KEYWORD_CODES = {word: token_type.value for word, token_type in KEYWORDS.items()}
+BYTE_KEYWORD_CODES = {word.encode('ascii'): code for word, code in KEYWORD_CODES.items()}
+
+# types whose value is the lowercased lexeme rather than the lexeme itself
+LOWERCASED = {TokenType.NOTE.value, TokenType.REST.value, TokenType.DYNAMIC.value}
+
+class TokenBuffer(Sequence):
+    """compact struct-of-arrays token stream over a source text
+    
+    instead of one Token and one Position object per token, the buffer keeps
+    a type code and the start/end offsets of every token in flat arrays.
+    indexing or iterating builds Token objects on demand, so code written
+    against a list of tokens keeps working unchanged
+    """
+    def __init__(self, source, codes, starts, ends, lines=None):
+        self.source = source
+        self.codes = codes
+        self.starts = starts
+        self.ends = ends
+        self.lines = LineIndex(source) if lines is None else lines
+    
+    @classmethod
+    def from_text(cls, text):
+        """lex text with the master pattern straight into flat arrays"""
+        offset_type = 'I' if len(text) < 2 ** 32 else 'Q'
+        codes = array('B')
+        starts = array(offset_type)
+        ends = array(offset_type)
+        scan_into(text, 0, codes, starts, ends)
+        return cls(text, codes, starts, ends)
+    
+    @classmethod
+    def from_file(cls, path):
+        """lex the memory-mapped bytes of an ASCII file
+        
+        the file is neither read into memory nor decoded up front; token
+        values are decoded one at a time when they are asked for
+        """
+        return cls.from_text(map_file(path))
+    
+    @classmethod
+    def from_text_parallel(cls, text, workers=None, min_chunk=1 << 20):
+        """lex text in chunks across a process pool and stitch the results
+        
+        no token and no comment continues past a newline, so the lexer is
+        back in its starting state right after every newline and chunks can
+        be cut there and lexed independently
+        """
+        workers = workers or os.cpu_count() or 1
+        bounds = split_at_newlines(text, max(min_chunk, len(text) // (workers * 4) + 1))
+        if workers == 1 or len(bounds) == 1:
+            return cls.from_text(text)
+        
+        offset_type = 'I' if len(text) < 2 ** 32 else 'Q'
+        codes = array('B')
+        starts = array(offset_type)
+        ends = array(offset_type)
+        jobs = [(text[start:end], end == len(text), offset_type) for start, end in bounds]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lex_chunk, jobs)
+            for (base, _), (chunk_codes, chunk_starts, chunk_ends) in zip(bounds, results):
+                codes.frombytes(chunk_codes)
+                extend_shifted(starts, chunk_starts, base)
+                extend_shifted(ends, chunk_ends, base)
+        return cls(text, codes, starts, ends)
+    
+    def relex(self, offset, deleted, inserted):
+        """return the buffer for this source after an edit
+        
+        the edit replaces the deleted characters at offset with inserted.
+        lexing restarts at the end of the last token that is certainly
+        unaffected and stops as soon as a new token starts where an old one
+        did, past the edit; the old tokens from there on are reused with
+        their offsets shifted, and the line table keeps its line starts
+        
+        an edit is still O(n) in the size of the source: the new source
+        string is built by copying the old one, and the new buffer copies
+        the arrays before the edit and shifts those after it. these are
+        block copies and vectorized adds, while lexing only covers the
+        tokens the edit touched
+        """
+        source = self.source
+        text = source[:offset] + inserted + source[offset + deleted:]
+        delta = len(inserted) - deleted
+        edit_end = offset + len(inserted)
+        
+        # a token's end is decided by the character right after it, so only
+        # tokens ending strictly before the edit can be kept as they are
+        keep = bisect_left(self.ends, offset)
+        restart = self.ends[keep - 1] if keep else 0
+        old_starts = self.starts
+        
+        def resync(start):
+            if start < edit_end:
+                return None
+            old_start = start - delta
+            j = bisect_left(old_starts, old_start, keep)
+            if j < len(old_starts) and old_starts[j] == old_start:
+                return j
+            return None
+        
+        # copy into fresh arrays, the buffer may be backed by a read-only cache file
+        offset_type = 'I' if len(text) < 2 ** 32 else 'Q'
+        codes = array('B', self.codes[:keep])
+        starts = array(offset_type, old_starts[:keep])
+        ends = array(offset_type, self.ends[:keep])
+        j = scan_into(text, restart, codes, starts, ends, resync)
+        if j is not None:
+            codes.frombytes(self.codes[j:])
+            extend_shifted(starts, old_starts[j:], delta)
+            extend_shifted(ends, self.ends[j:], delta)
+        return TokenBuffer(text, codes, starts, ends, self.lines.edited(text, offset, deleted, inserted))
+    
+    def type_at(self, i):
+        """return the token type of token i without building a Token"""
+        return TYPES_BY_CODE[self.codes[i]]
+    
+    def value_at(self, i):
+        """decode the value of token i from its slice of the source"""
+        code = self.codes[i]
+        if code == TokenType.EOF.value:
+            return None
+        text = self.source[self.starts[i]:self.ends[i]]
+        if not isinstance(text, str):
+            text = bytes(text).decode('ascii', 'replace')
+        if code == TokenType.DURATION.value:
+            return float(text) if '.' in text else int(text)
+        if code in LOWERCASED:
+            return text.lower()
+        return text
+    
+    def position_at(self, i):
+        """return the (line, col) position of token i"""
+        position = self.lines.position(self.starts[i])
+        if self.codes[i] == TokenType.EOF.value:
+            position.col -= 1  # EOF sits on the last column, like tokenize()
+        return position
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("token index out of range")
+        return Token(TYPES_BY_CODE[self.codes[i]], self.value_at(i), self.position_at(i))
+    
+    def __repr__(self):
+        return f"TokenBuffer({len(self)} tokens)"
+
+def scan_into(text, pos, codes, starts, ends, resync=None):
+    """append the tokens of text from pos onwards to the three arrays
+    
+    resync, if given, is called with the start of each token before it is
+    added; scanning stops at the first token for which it returns something
+    other than None, and that value is returned
+    """
+    add_code = codes.append
+    add_start = starts.append
+    add_end = ends.append
+    group_codes = GROUP_CODES
+    identifier = TokenType.IDENTIFIER.value
+    if isinstance(text, str):
+        pattern, keyword_codes = MASTER_PATTERN, KEYWORD_CODES
+    else:
+        pattern, keyword_codes = BYTES_PATTERN, BYTE_KEYWORD_CODES
+    
+    for match in pattern.finditer(text, pos):
+        kind = match.lastgroup
+        start, end = match.span(kind)
+        if resync is not None:
+            synced = resync(start)
+            if synced is not None:
+                return synced
+        if kind == 'WORD':
+            add_code(keyword_codes.get(text[start:end].lower(), identifier))
+        else:
+            add_code(group_codes[kind])
+        add_start(start)
+        add_end(end)
+        if kind == 'EOF':
+            break
+    return None
+
+def extend_shifted(target, offsets, delta):
+    """append offsets moved by delta to the array target
+    
+    used for the reused tail of a relexed buffer and for the chunks of a
+    parallel lex; with numpy the shift is one vectorized add over the raw
+    array instead of a python-level loop per token
+    """
+    # a cached buffer holds memoryviews, which name their type format
+    typecode = offsets.typecode if isinstance(offsets, array) else offsets.format
+    if not delta and typecode == target.typecode:
+        target.frombytes(memoryview(offsets).cast('B'))
+    elif np is not None and len(offsets):
+        shifted = np.frombuffer(offsets, dtype=typecode).astype(np.int64)
+        shifted += delta
+        target.frombytes(shifted.astype(target.typecode).tobytes())
+    else:
+        target.extend(offset + delta for offset in offsets)
+
+def split_at_newlines(text, size):
+    """return (start, end) chunk bounds of about size characters, cut after newlines"""
+    bounds = []
+    start = 0
+    while start < len(text):
+        cut = text.find('\n', start + size)
+        end = len(text) if cut == -1 else cut + 1
+        bounds.append((start, end))
+        start = end
+    return bounds or [(0, 0)]
+
+def lex_chunk(job):
+    """lex one chunk in a worker process, returning arrays of chunk-relative offsets
+    
+    the parent moves them to absolute offsets as it stitches the chunks
+    """
+    chunk, last, offset_type = job
+    codes = array('B')
+    starts = array(offset_type)
+    ends = array(offset_type)
+    scan_into(chunk, 0, codes, starts, ends)
+    if not last:
+        # only the final chunk ends the stream
+        codes.pop()
+        starts.pop()
+        ends.pop()
+    return codes, starts, ends
@@ -0,0 +1,115 @@
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from Lexer import LEXER_VERSION
+from TokenBuffer import TokenBuffer
+
+# cache file layout: header, one type code byte per token padded to 8 bytes,
+# then the start offsets and the end offsets as native unsigned integers
+HEADER = struct.Struct('<4s2sQ')  # magic, offset typecode, token count
+MAGIC = b'TOKC'
+
+class TokenCache:
+    """directory of lexed token streams keyed by a hash of the source file
+    
+    a hit maps the cached arrays straight from disk, so an unchanged file is
+    never lexed again. the least recently used entries are evicted once the
+    directory grows past max_bytes
+    """
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+    
+    def key(self, data):
+        """cache key for the raw bytes of a source file"""
+        digest = hashlib.sha256(f"lexer-v{LEXER_VERSION}:".encode())
+        digest.update(data)
+        return digest.hexdigest()
+    
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + '.tok')
+    
+    def load(self, path):
+        """return the TokenBuffer for the file at path, lexing it only on a miss"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        # same newline handling as opening the file in text mode
+        text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        entry = self.entry_path(self.key(data))
+        
+        tokens = self.read_entry(entry, text)
+        if tokens is not None:
+            self.hits += 1
+            os.utime(entry)  # mark as recently used for eviction
+            return tokens
+        
+        self.misses += 1
+        tokens = TokenBuffer.from_text(text)
+        self.write_entry(entry, tokens)
+        self.evict()
+        return tokens
+    
+    def read_entry(self, entry, text):
+        """map a cache file back into a TokenBuffer, or None if it is missing or bad"""
+        try:
+            with open(entry, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        
+        view = memoryview(mapped)
+        if len(view) < HEADER.size:
+            return None
+        magic, typecode, count = HEADER.unpack_from(view)
+        typecode = typecode.decode('ascii').strip()
+        size = array(typecode).itemsize if typecode in ('I', 'Q') else 0
+        codes_start = HEADER.size
+        starts_start = codes_start + padded(count)
+        ends_start = starts_start + count * size
+        if magic != MAGIC or not size or len(view) != ends_start + count * size:
+            return None
+        
+        codes = view[codes_start:codes_start + count]
+        starts = view[starts_start:ends_start].cast(typecode)
+        ends = view[ends_start:].cast(typecode)
+        return TokenBuffer(text, codes, starts, ends)
+    
+    def write_entry(self, entry, tokens):
+        """store the arrays of tokens, replacing the entry atomically"""
+        count = len(tokens)
+        temporary = f"{entry}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, tokens.starts.typecode.encode('ascii').ljust(2), count))
+            f.write(tokens.codes)
+            f.write(bytes(padded(count) - count))
+            f.write(tokens.starts)
+            f.write(tokens.ends)
+        os.replace(temporary, entry)
+    
+    def evict(self):
+        """delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.tok'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+    
+    def stats(self):
+        return f"token cache: {self.hits} hits, {self.misses} misses"
+
+def padded(count):
+    """round a byte count up to a multiple of 8"""
+    return (count + 7) & ~7
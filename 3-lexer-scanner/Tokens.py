@@ -51,6 +51,8 @@ class TokenType(Enum):
     ERROR = auto()         # lexical error
 
 class Token:
+    __slots__ = ('type', 'value', 'position')
+    
     def __init__(self, token_type, value=None, position=None):
         self.type = token_type
         self.value = value
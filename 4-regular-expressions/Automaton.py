@@ -0,0 +1,322 @@
+from array import array
+from RegexParser import Literal, CharSet, Sequence, Choice, Repeat, parse_regex
+
+# compiles RegexNode asts into a minimized dfa stored as flat integer tables:
+# ast -> thompson nfa -> subset construction -> hopcroft minimization.
+
+# --- alphabet ---
+
+def collect_atoms(node, atoms):
+    # gather every character set the ast can consume, as (chars, negated) pairs.
+    if isinstance(node, Literal):
+        for char in node.char:
+            atoms.add((char, False))
+    elif isinstance(node, CharSet):
+        atoms.add((node.chars, node.negated))
+    elif isinstance(node, (Sequence, Choice)):
+        for child in node.children:
+            collect_atoms(child, atoms)
+    elif isinstance(node, Repeat):
+        collect_atoms(node.child, atoms)
+    else:
+        raise ValueError(f"automaton error: unsupported node {node}")
+    return atoms
+
+class Alphabet:
+    # splits characters into equivalence classes that no pattern can tell apart,
+    # so the transition table has one column per class instead of per character.
+    # class 0 holds every character that no pattern names explicitly.
+    def __init__(self, atoms):
+        self.atoms = sorted(atoms)
+        named = sorted({char for chars, _ in self.atoms for char in chars})
+        signatures = {(False,) * len(self.atoms): 0}
+        self.classes = {}
+        for char in named:
+            signature = tuple(char in chars for chars, _ in self.atoms)
+            self.classes[char] = signatures.setdefault(signature, len(signatures))
+        self.signatures = sorted(signatures, key=signatures.get)
+        self.size = len(self.signatures)
+
+    def class_of(self, char):
+        return self.classes.get(char, 0)
+
+    def classes_for(self, chars, negated=False):
+        # the set of classes an atom accepts
+        index = self.atoms.index((chars, negated))
+        return frozenset(cls for cls, signature in enumerate(self.signatures)
+                         if signature[index] != negated)
+
+# --- thompson nfa ---
+
+class NFA:
+    # states are integers; eps[s] lists epsilon targets, edges[s] lists (classes, target).
+    # a bounded nfa caps '*' and '+' at max_rep, like generation does.
+    def __init__(self, alphabet, bounded=False):
+        self.alphabet = alphabet
+        self.bounded = bounded
+        self.eps = []
+        self.edges = []
+        self.accepts = {} # final state -> tag of the pattern it ends
+
+    def new_state(self):
+        self.eps.append([])
+        self.edges.append([])
+        return len(self.eps) - 1
+
+    def build(self, node):
+        # returns (start, end) of a fragment recognizing node.
+        start = self.new_state()
+        if isinstance(node, Literal):
+            end = start
+            for char in node.char:
+                target = self.new_state()
+                self.edges[end].append((self.alphabet.classes_for(char), target))
+                end = target
+            return start, end
+        if isinstance(node, CharSet):
+            end = self.new_state()
+            self.edges[start].append((self.alphabet.classes_for(node.chars, node.negated), end))
+            return start, end
+        if isinstance(node, Sequence):
+            end = start
+            for child in node.children:
+                child_start, child_end = self.build(child)
+                self.eps[end].append(child_start)
+                end = child_end
+            return start, end
+        if isinstance(node, Choice):
+            end = self.new_state()
+            for child in node.children:
+                child_start, child_end = self.build(child)
+                self.eps[start].append(child_start)
+                self.eps[child_end].append(end)
+            return start, end
+        if isinstance(node, Repeat):
+            # the language of '*' and '+' is unbounded; MAX_REPEATS only caps generation
+            # (and the bounded language)
+            end = start
+            for _ in range(node.min_rep):
+                child_start, child_end = self.build(node.child)
+                self.eps[end].append(child_start)
+                end = child_end
+            if node._original_max_rep == float('inf') and not self.bounded:
+                child_start, child_end = self.build(node.child)
+                self.eps[end].append(child_start)
+                self.eps[child_end].append(child_start)
+                loop_end = self.new_state()
+                self.eps[end].append(loop_end)
+                self.eps[child_end].append(loop_end)
+                return start, loop_end
+            final = self.new_state()
+            self.eps[end].append(final)
+            for _ in range(node.max_rep - node.min_rep):
+                child_start, child_end = self.build(node.child)
+                self.eps[end].append(child_start)
+                self.eps[child_end].append(final)
+                end = child_end
+            return start, final
+        raise ValueError(f"automaton error: unsupported node {node}")
+
+    def closure(self, states):
+        # epsilon closure of a set of states
+        stack = list(states)
+        seen = set(states)
+        while stack:
+            for target in self.eps[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return frozenset(seen)
+
+# --- subset construction ---
+
+def determinize(nfa, start):
+    # returns (rows, labels): rows[s][cls] is the next dfa state or -1, labels[s] the
+    # winning tag (lowest tag = highest priority) or -1. dfa state 0 is the start.
+    size = nfa.alphabet.size
+    first = nfa.closure([start])
+    index = {first: 0}
+    order = [first]
+    rows = []
+    labels = []
+    for states in order: # order grows while we walk it
+        moves = {}
+        for state in states:
+            for classes, target in nfa.edges[state]:
+                for cls in classes:
+                    moves.setdefault(cls, set()).add(target)
+        row = [-1] * size
+        for cls, targets in moves.items():
+            closed = nfa.closure(targets)
+            if closed not in index:
+                index[closed] = len(order)
+                order.append(closed)
+            row[cls] = index[closed]
+        rows.append(row)
+        tags = [nfa.accepts[state] for state in states if state in nfa.accepts]
+        labels.append(min(tags) if tags else -1)
+    return rows, labels
+
+# --- hopcroft minimization ---
+
+def minimize(rows, labels, size):
+    # merges equivalent states. the missing (-1) transitions go to an explicit sink,
+    # which also absorbs every state that can no longer reach an accepting state.
+    sink = len(rows)
+    delta = [[sink if target < 0 else target for target in row] for row in rows]
+    delta.append([sink] * size)
+    labels = labels + [-1]
+
+    inverse = [[[] for _ in delta] for _ in range(size)]
+    for state, row in enumerate(delta):
+        for cls, target in enumerate(row):
+            inverse[cls][target].append(state)
+
+    groups = {}
+    for state, label in enumerate(labels):
+        groups.setdefault(label, set()).add(state)
+    blocks = list(groups.values())
+    block_of = [0] * len(delta)
+    for number, block in enumerate(blocks):
+        for state in block:
+            block_of[state] = number
+
+    pending = set(range(len(blocks)))
+    while pending:
+        splitter = list(blocks[pending.pop()])
+        for cls in range(size):
+            # states that move into the splitter on this class, grouped by block
+            touched = {}
+            for target in splitter:
+                for state in inverse[cls][target]:
+                    touched.setdefault(block_of[state], set()).add(state)
+            for number, inside in touched.items():
+                block = blocks[number]
+                if len(inside) == len(block):
+                    continue
+                block -= inside
+                new = len(blocks)
+                blocks.append(inside)
+                for state in inside:
+                    block_of[state] = new
+                if number in pending or len(inside) <= len(block):
+                    pending.add(new)
+                else:
+                    pending.add(number)
+
+    # renumber with the start block first and the sink block as -1
+    dead = block_of[sink]
+    numbering = {block_of[0]: 0} if block_of[0] != dead else {}
+    for state in range(len(rows)):
+        number = block_of[state]
+        if number != dead and number not in numbering:
+            numbering[number] = len(numbering)
+    transitions = array('i', [-1]) * (len(numbering) * size)
+    accepts = array('i', [-1]) * len(numbering)
+    for state in range(len(rows)):
+        number = block_of[state]
+        if number == dead:
+            continue
+        new = numbering[number]
+        accepts[new] = labels[state]
+        for cls, target in enumerate(delta[state]):
+            target_block = block_of[target]
+            transitions[new * size + cls] = -1 if target_block == dead else numbering[target_block]
+    return transitions, accepts
+
+# --- compiled dfa ---
+
+class DFA:
+    # flat table automaton: transitions[state * classes + cls] is the next state or -1,
+    # accepts[state] the tag of the pattern accepted there or -1. state 0 is the start;
+    # a dfa with no states (empty language) has no start at all.
+    def __init__(self, alphabet, transitions, accepts):
+        self.alphabet = alphabet
+        self.transitions = transitions
+        self.accepts = accepts
+
+    @property
+    def states(self):
+        return len(self.accepts)
+
+    def run(self, text):
+        # the state after reading text from the start, or -1 once no pattern can match.
+        if not self.accepts:
+            return -1
+        transitions = self.transitions
+        classes = self.alphabet.classes.get
+        width = self.alphabet.size
+        state = 0
+        for char in text:
+            state = transitions[state * width + classes(char, 0)]
+            if state < 0:
+                return -1
+        return state
+
+    def matches(self, text):
+        # true if the whole of text is in the language; one table lookup per character.
+        state = self.run(text)
+        return state >= 0 and self.accepts[state] >= 0
+
+    def match_tag(self, text):
+        # the index of the (first) pattern matching the whole of text, or -1.
+        state = self.run(text)
+        return self.accepts[state] if state >= 0 else -1
+
+def compile_dfa(patterns, bounded=False):
+    # builds one minimized dfa for several asts; accepting a string that more than one
+    # pattern matches reports the earliest pattern's index. a bounded dfa accepts only
+    # what generate() can produce, and has no cycles.
+    atoms = set()
+    for node in patterns:
+        collect_atoms(node, atoms)
+    nfa = NFA(Alphabet(atoms), bounded)
+    start = nfa.new_state()
+    for tag, node in enumerate(patterns):
+        node_start, node_end = nfa.build(node)
+        nfa.eps[start].append(node_start)
+        nfa.accepts[node_end] = tag
+    rows, labels = determinize(nfa, start)
+    transitions, accepts = minimize(rows, labels, nfa.alphabet.size)
+    return DFA(nfa.alphabet, transitions, accepts)
+
+def compile_regex(pattern, bounded=False):
+    # minimized dfa for one pattern, given as a regex string or an ast.
+    return compile_dfa([parse_regex(pattern) if isinstance(pattern, str) else pattern], bounded)
+
+# --- self-check on the lab patterns ---
+
+if __name__ == "__main__":
+    import random
+    import re
+    import time
+    from Main import variant3_patterns
+
+    def python_regex(pattern):
+        # the same pattern in python's re syntax, as an independent reference
+        return re.compile(pattern.replace('²', '{2}').replace('³', '{3}'))
+
+    rng = random.Random(0)
+    for pattern in variant3_patterns:
+        ast = parse_regex(pattern)
+        dfa = compile_regex(ast)
+        reference = python_regex(pattern)
+        generated = [ast.generate() for _ in range(10000)]
+        assert all(dfa.matches(s) for s in generated), pattern
+
+        # near misses: generated strings with one character deleted, replaced or inserted
+        symbols = sorted(set(''.join(generated))) + ['Z']
+        candidates = []
+        for s in generated[:3000]:
+            i = rng.randrange(len(s) + 1)
+            candidates += [s[:i] + s[i + 1:], s[:i] + rng.choice(symbols) + s[i + 1:],
+                           s[:i] + rng.choice(symbols) + s[i:]]
+        disagreements = [s for s in candidates if dfa.matches(s) != bool(reference.fullmatch(s))]
+        assert not disagreements, (pattern, disagreements[:5])
+
+        start = time.perf_counter()
+        for s in candidates:
+            dfa.matches(s)
+        rate = len(candidates) / (time.perf_counter() - start)
+        print(f"{pattern:<24} {dfa.states:3d} states, {dfa.alphabet.size:2d} classes, "
+              f"{len(generated) + len(candidates)} strings checked, {rate:,.0f} matches/sec")
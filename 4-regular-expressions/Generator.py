@@ -0,0 +1,199 @@
+import random
+from RegexParser import Literal, CharSet, Sequence, Choice, Repeat, parse_regex
+from Weights import choice_table, repeat_table
+
+# compiles a RegexNode ast once into a flat instruction program and runs it in a loop,
+# for generating many strings without recursion, string concatenation or log checks.
+
+# --- instructions ---
+# every instruction is an (opcode, a, b) triple; pc is the index of the next one.
+
+EMIT = 0    # append the string a
+PICK = 1    # append one random character of the string a
+BRANCH = 2  # jump to one of the pcs in the tuple a
+JUMP = 3    # jump to pc a
+REPEAT = 4  # push a random count for the loop that follows
+LOOP = 5    # run the loop body once more if the count on top allows it, else pop it and jump to a
+REPEAT_EMIT = 6  # append the string a repeated a random count of times
+REPEAT_PICK = 7  # append a random count of random characters of a
+# the random counts are drawn from b = (low, span, table), giving low to low + span - 1.
+# PICK and BRANCH choose uniformly when b is None and from the alias table b = (prob,
+# alias) otherwise; a count table is one too, over the span
+
+OPCODE_NAMES = ['EMIT', 'PICK', 'BRANCH', 'JUMP', 'REPEAT', 'LOOP', 'REPEAT_EMIT', 'REPEAT_PICK']
+
+# --- compiler ---
+
+def pick_pool(node):
+    # the characters a node picks from uniformly, if it always produces one character:
+    # a one-character literal, a character set or a choice of one-character literals.
+    # a repeated alternative stays repeated in the pool, keeping its weight
+    if isinstance(node, Literal) and len(node.char) == 1:
+        return node.char
+    if isinstance(node, CharSet):
+        return node.pool
+    if isinstance(node, Choice) and all(isinstance(c, Literal) and len(c.char) == 1 for c in node.children):
+        return ''.join(c.char for c in node.children)
+    return None
+
+def compile_program(node, weights=None):
+    # returns the instruction list for node. branches end in a jump past the choice,
+    # and a loop is REPEAT, then LOOP, then the body, then a jump back to the LOOP.
+    # the common shapes get single instructions instead: adjacent literals become
+    # one EMIT, one-character choices a PICK, and repeated literals or picks a
+    # REPEAT_EMIT or REPEAT_PICK. weights is an optional side table of branch weights
+    # and repeat count histograms by node (see Weights.py)
+    weights = weights or {}
+    program = []
+
+    def emit(node):
+        pool = pick_pool(node)
+        if isinstance(node, Literal):
+            # no jump ever lands right after an EMIT, so literals can be merged into it
+            if program and program[-1] is not None and program[-1][0] == EMIT:
+                program[-1] = (EMIT, program[-1][1] + node.char, None)
+            else:
+                program.append((EMIT, node.char, None))
+        elif pool is not None:
+            program.append((PICK, pool, choice_table(node, weights[node]) if node in weights else None))
+        elif isinstance(node, Sequence):
+            for child in node.children:
+                emit(child)
+        elif isinstance(node, Choice):
+            branch = len(program)
+            program.append(None) # patched once the branch starts are known
+            starts = []
+            exits = []
+            for child in node.children:
+                starts.append(len(program))
+                emit(child)
+                exits.append(len(program))
+                program.append(None)
+            for pc in exits:
+                program[pc] = (JUMP, len(program), None)
+            program[branch] = (BRANCH, tuple(starts), choice_table(node, weights[node]) if node in weights else None)
+        elif isinstance(node, Repeat):
+            if node in weights:
+                bounds = repeat_table(node, weights[node])
+            else:
+                bounds = (node.min_rep, node.max_rep - node.min_rep + 1, None)
+            if isinstance(node.child, Literal):
+                program.append((REPEAT_EMIT, node.child.char, bounds))
+                return
+            pool = pick_pool(node.child)
+            if pool is not None and node.child not in weights: # a weighted pool picks in the loop
+                program.append((REPEAT_PICK, pool, bounds))
+                return
+            program.append((REPEAT, None, bounds))
+            loop = len(program)
+            program.append(None)
+            emit(node.child)
+            program.append((JUMP, loop, None))
+            program[loop] = (LOOP, len(program), None)
+        else:
+            raise ValueError(f"generator error: unsupported node {node}")
+
+    emit(node)
+    return program
+
+def format_program(program):
+    # one numbered line per instruction, for inspecting what a pattern compiles to.
+    lines = []
+    for pc, (op, a, b) in enumerate(program):
+        operands = ' '.join(repr(x) for x in (a, b) if x is not None)
+        lines.append(f"{pc:4d}  {OPCODE_NAMES[op]:<12}{operands}")
+    return "\n".join(lines)
+
+# --- interpreter ---
+
+def run_program(program, count=1, rng=random):
+    # runs the program count times and returns the generated strings. an alias draw
+    # reuses the fraction of the uniform number that chose the column.
+    uniform = rng.random
+    size = len(program)
+    results = []
+    for _ in range(count):
+        out = []
+        append = out.append
+        counts = []
+        pc = 0
+        while pc < size:
+            op, a, b = program[pc]
+            if op == EMIT:
+                append(a)
+            elif op == PICK:
+                x = uniform() * len(a)
+                i = int(x)
+                if b is not None and x - i >= b[0][i]:
+                    i = b[1][i]
+                append(a[i])
+            elif op == REPEAT_EMIT:
+                x = uniform() * b[1]
+                i = int(x)
+                if b[2] is not None and x - i >= b[2][0][i]:
+                    i = b[2][1][i]
+                append(a * (b[0] + i))
+            elif op == REPEAT_PICK:
+                x = uniform() * b[1]
+                i = int(x)
+                if b[2] is not None and x - i >= b[2][0][i]:
+                    i = b[2][1][i]
+                k = len(a)
+                for _ in range(b[0] + i):
+                    append(a[int(uniform() * k)])
+            elif op == BRANCH:
+                x = uniform() * len(a)
+                i = int(x)
+                if b is not None and x - i >= b[0][i]:
+                    i = b[1][i]
+                pc = a[i]
+                continue
+            elif op == JUMP:
+                pc = a
+                continue
+            elif op == REPEAT:
+                x = uniform() * b[1]
+                i = int(x)
+                if b[2] is not None and x - i >= b[2][0][i]:
+                    i = b[2][1][i]
+                counts.append(b[0] + i)
+            elif counts[-1]: # LOOP with repetitions left
+                counts[-1] -= 1
+            else: # LOOP done
+                counts.pop()
+                pc = a
+                continue
+            pc += 1
+        results.append(''.join(out))
+    return results
+
+def generate_many(pattern, n, rng=random, weights=None):
+    # n random strings for a regex string or ast, with the same distribution as generate()
+    # unless weights (keyed by nodes of the given ast) says otherwise.
+    node = parse_regex(pattern) if isinstance(pattern, str) else pattern
+    return run_program(compile_program(node, weights), n, rng)
+
+# --- comparison with the recursive generator ---
+
+if __name__ == "__main__":
+    import time
+    from Automaton import compile_regex
+    from Main import variant3_patterns
+
+    n = 200000
+    for pattern in variant3_patterns:
+        ast = parse_regex(pattern)
+        dfa = compile_regex(ast)
+
+        start = time.perf_counter()
+        recursive = [ast.generate() for _ in range(n)]
+        recursive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compiled = generate_many(ast, n)
+        compiled_time = time.perf_counter() - start
+
+        assert all(dfa.matches(s) for s in compiled), pattern
+        print(f"{pattern:<24} {len(compile_program(ast)):3d} instructions, "
+              f"generate() {n / recursive_time:,.0f}/s, generate_many {n / compiled_time:,.0f}/s "
+              f"({recursive_time / compiled_time:.1f}x)")
@@ -0,0 +1,169 @@
+from Automaton import compile_regex
+from RegexParser import Literal, CharSet, Sequence, Choice, Repeat, parse_regex
+
+# exact size and length distribution of the strings a pattern can generate, and their
+# enumeration in shortlex order, worked out on a bounded dfa instead of by generating.
+# a dfa reads every string along exactly one path, so counting paths counts distinct
+# strings; counting over the ast would count (A|A) or A*A* derivations twice.
+
+def class_members(alphabet):
+    # the sorted characters of each alphabet class. class 0 is everything no pattern
+    # names; a negated set only generates printable characters, so it stands for those.
+    members = [[] for _ in range(alphabet.size)]
+    for char, cls in alphabet.classes.items():
+        members[cls].append(char)
+    members[0] = [c for c in CharSet.PRINTABLE if c not in alphabet.classes]
+    return [sorted(chars) for chars in members]
+
+class Language:
+    # the finite set of strings generate() can produce: the pattern with every repeat
+    # capped at max_rep. counts are exact, as python ints never overflow.
+    def __init__(self, pattern):
+        self.ast = parse_regex(pattern) if isinstance(pattern, str) else pattern
+        self.dfa = compile_regex(self.ast, bounded=True)
+        self.members = class_members(self.dfa.alphabet)
+        width = self.dfa.alphabet.size
+        transitions = self.dfa.transitions
+        # moves[state] lists (class, target); edges[state] lists (char, target) by char
+        self.moves = []
+        self.edges = []
+        for state in range(self.dfa.states):
+            moves = [(cls, transitions[state * width + cls]) for cls in range(width)
+                     if transitions[state * width + cls] >= 0 and self.members[cls]]
+            self.moves.append(moves)
+            self.edges.append(sorted((char, target) for cls, target in moves
+                                     for char in self.members[cls]))
+        self.suffix = self._count_suffixes()
+        # counts[length] is the number of strings of that length
+        self.counts = self.suffix[0] if self.suffix else [0]
+
+    def _count_suffixes(self):
+        # suffix[state][length]: strings of that length leading from state to acceptance.
+        # the bounded dfa has no cycles, so the states can be counted in reverse
+        # topological order, every state after all of its targets
+        states = self.dfa.states
+        incoming = [0] * states
+        for moves in self.moves:
+            for _, target in moves:
+                incoming[target] += 1
+        order = [state for state in range(states) if not incoming[state]]
+        for state in order: # order grows while we walk it
+            for _, target in self.moves[state]:
+                incoming[target] -= 1
+                if not incoming[target]:
+                    order.append(target)
+        if len(order) < states:
+            raise ValueError("language error: the automaton has a cycle, the language is infinite")
+
+        suffix = [None] * states
+        for state in reversed(order):
+            total = [1 if self.dfa.accepts[state] >= 0 else 0]
+            for cls, target in self.moves[state]:
+                weight = len(self.members[cls])
+                counts = suffix[target]
+                if len(total) <= len(counts):
+                    total.extend([0] * (len(counts) + 1 - len(total)))
+                for length, n in enumerate(counts, 1):
+                    total[length] += weight * n
+            suffix[state] = total
+        return suffix
+
+    @property
+    def size(self):
+        return sum(self.counts)
+
+    @property
+    def max_length(self):
+        return len(self.counts) - 1
+
+    def count(self, length):
+        return self.counts[length] if 0 <= length < len(self.counts) else 0
+
+    def distribution(self):
+        # (length, count, share of the language) for every length that has strings
+        size = self.size
+        return [(length, n, n / size) for length, n in enumerate(self.counts) if n]
+
+    def strings(self, length):
+        # the strings of one length in lexicographic order, produced lazily; branches
+        # that cannot finish at this length are never entered
+        if not self.count(length):
+            return
+        if not length:
+            yield ''
+            return
+        suffix = self.suffix
+        edges = self.edges
+        # a depth-first walk with an explicit stack, one frame per character of the
+        # prefix: (state, characters still to go, the state's remaining edges)
+        prefix = []
+        stack = [(0, length, iter(edges[0]))]
+        while stack:
+            _, remaining, options = stack[-1]
+            for char, target in options:
+                counts = suffix[target]
+                if remaining <= len(counts) and counts[remaining - 1]:
+                    if remaining == 1:
+                        yield ''.join(prefix) + char
+                        continue
+                    prefix.append(char)
+                    stack.append((target, remaining - 1, iter(edges[target])))
+                    break
+            else:
+                stack.pop()
+                if prefix:
+                    prefix.pop()
+
+    def shortlex(self):
+        # every string of the language, shorter strings first, then lexicographically
+        for length in range(len(self.counts)):
+            yield from self.strings(length)
+
+    __iter__ = shortlex
+
+# --- self-check against brute-force expansion ---
+
+if __name__ == "__main__":
+    import time
+    from Main import variant3_patterns
+
+    def expand(node):
+        # the set of strings of a node, built the slow way
+        if isinstance(node, Literal):
+            return {node.char}
+        if isinstance(node, CharSet):
+            return set(Language(node).shortlex())
+        if isinstance(node, Sequence):
+            strings = {''}
+            for child in node.children:
+                strings = {a + b for a in strings for b in expand(child)}
+            return strings
+        if isinstance(node, Choice):
+            return set().union(*(expand(child) for child in node.children))
+        child = expand(node.child)
+        strings = set()
+        level = {''}
+        for count in range(node.max_rep + 1):
+            if count >= node.min_rep:
+                strings |= level
+            level = {a + b for a in level for b in child}
+        return strings
+
+    # the last two are ambiguous: counting derivations on the ast gives 2 and 36
+    for pattern in variant3_patterns + ["(A|A)", "A*A*"]:
+        start = time.perf_counter()
+        language = Language(pattern)
+        listed = list(language)
+        elapsed = time.perf_counter() - start
+
+        expected = sorted(expand(parse_regex(pattern)), key=lambda s: (len(s), s))
+        assert listed == expected, pattern
+        assert language.size == len(expected)
+        assert all(language.count(n) == sum(len(s) == n for s in expected) for n in range(language.max_length + 2))
+
+        lengths = ', '.join(f"{length}:{n}" for length, n, _ in language.distribution())
+        print(f"{pattern:<24} {language.size:>6} strings, lengths {lengths} ({elapsed * 1000:.1f} ms)")
+
+    # counts do not need the strings: a few repeats of a wide choice are far too many to list
+    wide = Language("((A|B|C|D|E|F|G|H)(1|2|3|4|5|6|7|8|9)+)+")
+    print(f"{'wide pattern':<24} {wide.size} strings, longest {wide.max_length}, first {next(iter(wide))!r}")
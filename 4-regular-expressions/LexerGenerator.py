@@ -0,0 +1,100 @@
+from RegexParser import Literal, CharSet, Sequence, Repeat, parse_regex
+from Automaton import compile_dfa
+
+# builds table-driven lexers from (token type, pattern) specs. patterns use the same
+# syntax as RegexParser; characters the syntax reserves ('(', ')', '|', '+', '*', '?')
+# or character classes can be given as ready-made nodes with literal() and chars().
+
+# --- spec helpers ---
+
+def literal(text):
+    # matches text exactly, even if it contains regex syntax characters.
+    if len(text) == 1:
+        return Literal(text)
+    return Sequence([Literal(char) for char in text])
+
+def chars(characters, negated=False):
+    # matches one character from characters (or, negated, any other character).
+    return CharSet(characters, negated)
+
+# --- generated lexer ---
+
+class DFALexer:
+    # runs the combined dfa with longest match; ties go to the spec listed first.
+    # specs with a token type of None (whitespace, comments) are matched but dropped.
+    def __init__(self, specs, error_type='ERROR'):
+        self.types = [token_type for token_type, _ in specs]
+        patterns = [parse_regex(p) if isinstance(p, str) else p for _, p in specs]
+        self.dfa = compile_dfa(patterns)
+        self.error_type = error_type
+
+    def tokenize(self, text):
+        # yields (token type, lexeme, offset) tuples. a character no spec can start
+        # with becomes a one-character error token, and lexing carries on after it.
+        transitions = self.dfa.transitions
+        accepts = self.dfa.accepts
+        classes = self.dfa.alphabet.classes.get
+        width = self.dfa.alphabet.size
+        types = self.types
+        alive = self.dfa.states > 0
+        size = len(text)
+        pos = 0
+        while pos < size:
+            state = 0
+            best = -1
+            best_end = pos
+            i = pos
+            while alive and i < size:
+                state = transitions[state * width + classes(text[i], 0)]
+                if state < 0:
+                    break
+                i += 1
+                if accepts[state] >= 0:
+                    best = accepts[state]
+                    best_end = i
+            if best < 0:
+                yield (self.error_type, text[pos], pos)
+                pos += 1
+                continue
+            if types[best] is not None:
+                yield (types[best], text[pos:best_end], pos)
+            pos = best_end
+
+# --- example: the music notation tokens of the lexer-scanner lab ---
+
+DIGITS = '0123456789'
+LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+INFINITE = float('inf')
+
+MUSIC_SPECS = [
+    (None, Repeat(chars(' \t\r\n'), 1, INFINITE)),
+    (None, Sequence([literal('//'), Repeat(chars('\n', negated=True), 0, INFINITE), Repeat(Literal('\n'), 0, 1)])),
+    ('DURATION', Sequence([Repeat(chars(DIGITS), 1, INFINITE),
+                           Repeat(Sequence([Literal('.'), Repeat(chars(DIGITS), 0, INFINITE)]), 0, 1)])),
+    ('COMMAND', Sequence([Literal('\\'), Repeat(chars(LETTERS + DIGITS + '_'), 0, INFINITE)])),
+    ('NOTE', chars('abcdefgABCDEFG')),
+    ('REST', chars('rR')),
+    ('DYNAMIC', 'pp|p|mp|mf|ff'),
+    ('IDENTIFIER', Sequence([chars(LETTERS + '_'), Repeat(chars(LETTERS + DIGITS + '_'), 0, INFINITE)])),
+    ('SHARP', '#'),
+    ('DOT', '.'),
+    ('TRIPLET', '~'),
+    ('PLUS', literal('+')),
+    ('MINUS', '-'),
+    ('EQUALS', '='),
+    ('LPAREN', literal('(')),
+    ('RPAREN', literal(')')),
+    ('LBRACE', '{'),
+    ('RBRACE', '}'),
+    ('COMMA', ','),
+    ('REPEAT_START', literal('|:')),
+    ('BAR', literal('|')),
+    ('REPEAT_END', literal(':|')),
+]
+
+if __name__ == "__main__":
+    lexer = DFALexer(MUSIC_SPECS)
+    print(f"music lexer: {lexer.dfa.states} dfa states, {lexer.dfa.alphabet.size} character classes")
+    sample = "\\tempo=120 |: c 4 d# 8. // melody\nmelody = { e f } :| mf $"
+    for token_type, lexeme, offset in lexer.tokenize(sample):
+        print(f"{offset:3d}  {token_type:<12} {lexeme!r}")
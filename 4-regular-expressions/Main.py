@@ -11,7 +11,7 @@ RESET = "\033[0m"
 # --- import parser and MAX_REPEATS ---
 try:
     # using the user-specified filename 'RegexParser.py'
-    from RegexParser import parse_regex, RegexNode, MAX_REPEATS
+    from RegexParser import parse_regex, RegexNode, GenerationTrace, MAX_REPEATS
 except ImportError:
     print(f"{RED}Error: Could not import required components from RegexParser.py.{RESET}")
     print(f"{RED}Please ensure 'RegexParser.py' exists and defines 'parse_regex', 'RegexNode', and 'MAX_REPEATS'.{RESET}")
@@ -42,30 +42,24 @@ def process_pattern(pattern_string):
 
         # 2. generate a random string using the ast
         print(f"\n{YELLOW}2. Generating random string...{RESET}")
-        generation_log = []
-        generated_string = ast_root.generate(log=generation_log)
+        trace = GenerationTrace() # records compact events, formatted below
+        generated_string = ast_root.generate(trace)
 
         # 3. print results
         print(f"\n{YELLOW}3. Results:{RESET}")
         print(f"   Generated String: {GREEN}\"{generated_string}\"{RESET}") # color the generated string
 
         print(f"\n{YELLOW}4. Generation Process Log (Bonus):{RESET}")
-        if generation_log:
+        if trace:
             indent = "   "
-            current_indent = indent
-            for step in generation_log:
+            for depth, step in trace.render(): # depth follows entering / exiting steps
                 if step.startswith("->"):
                     log_color = CYAN
                 elif step.startswith("<-"):
                     log_color = CYAN
                 else:
                     log_color = "" # default terminal color
-
-                if step.startswith("<- exiting"):
-                    current_indent = current_indent[:-len(indent)] if len(current_indent) > len(indent) else indent
-                print(f"{current_indent}{log_color}{step}{RESET}") # apply reset if color used
-                if step.startswith("-> entering"):
-                    current_indent += indent
+                print(f"{indent * (depth + 1)}{log_color}{step}{RESET}") # apply reset if color used
         else:
             print(f"{YELLOW}   (Log is empty or logging not implemented correctly in generate methods){RESET}")
         success = True
@@ -96,8 +90,43 @@ def display_menu():
     print(f"{YELLOW} 4.{RESET} Exit")
     print(VIOLET + "="*40 + RESET)
 
+# --- bulk generation command ---
+def bulk_command(argv):
+    """Generates many strings for one pattern into a file, without the menu."""
+    import argparse
+    import time
+    from Bulk import bulk_generate
+    from Optimizer import optimize
+
+    parser = argparse.ArgumentParser(prog="Main.py", description="Bulk regex string generation (no arguments opens the menu).")
+    parser.add_argument("pattern", help="regex pattern, or 1-3 for a predefined Variant 3 pattern")
+    parser.add_argument("-n", "--count", type=int, default=1_000_000, help="number of strings (default 1000000)")
+    parser.add_argument("-o", "--output", default="generated.txt", help="output file, one string per line")
+    parser.add_argument("--seed", type=int, default=0, help="seed; same seed and shard count give the same file")
+    parser.add_argument("--shards", type=int, default=None, help="number of shards (default: one per process)")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: cpu count)")
+    args = parser.parse_args(argv)
+
+    pattern = args.pattern
+    if pattern.isdigit() and 1 <= int(pattern) <= len(variant3_patterns):
+        pattern = variant3_patterns[int(pattern) - 1]
+    try:
+        ast_root = parse_regex(pattern)
+    except ValueError:
+        return 1 # the parser has already reported the error
+
+    start = time.perf_counter()
+    counts = bulk_generate(optimize(ast_root), args.count, args.output, args.seed, args.shards, args.processes)
+    elapsed = time.perf_counter() - start
+    print(f"{GREEN}Wrote {args.count} strings for {pattern} to {args.output}{RESET} "
+          f"({len(counts)} shards, {elapsed:.2f}s, {args.count / elapsed:,.0f} strings/s)")
+    return 0
+
 # --- main execution loop ---
 if __name__ == "__main__":
+    if len(sys.argv) > 1: # command line use, see bulk_command
+        sys.exit(bulk_command(sys.argv[1:]))
+
     print(VIOLET + "*"*40 + RESET)
     print(f"{CYAN} Welcome to the Dynamic Regex Generator! {RESET}")
     print(VIOLET + "*"*40 + RESET)
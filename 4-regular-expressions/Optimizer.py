@@ -0,0 +1,135 @@
+from math import lcm
+from RegexParser import Literal, CharSet, Sequence, Choice, Repeat, parse_regex
+
+# rewrites a RegexNode ast into a smaller one with the same language and the same
+# generate() distribution, so generation and the automaton walk fewer nodes:
+#   - nested sequences are flattened and runs of literals merged into one literal
+#   - nested choices are flattened (see flatten_choice for how the odds are kept)
+#   - a choice of distinct single characters becomes a CharSet
+#   - a repeat with a fixed count is unrolled, or becomes one literal
+# the input ast is left alone; unchanged leaves are shared with the result.
+
+MAX_FLAT_CHOICE = 32 # nested choices that would need more options stay nested
+
+def optimize(node):
+    if isinstance(node, (Literal, CharSet)):
+        return node
+    if isinstance(node, Sequence):
+        return make_sequence([optimize(child) for child in node.children])
+    if isinstance(node, Choice):
+        return make_choice([optimize(child) for child in node.children])
+    if isinstance(node, Repeat):
+        child = optimize(node.child)
+        if node.min_rep == node.max_rep:
+            if isinstance(child, Literal):
+                return Literal(child.char * node.min_rep)
+            return make_sequence([child] * node.min_rep) # the same child node n times
+        return Repeat(child, node.min_rep, node._original_max_rep)
+    raise ValueError(f"optimizer error: unsupported node {node}")
+
+def make_sequence(children):
+    # splices in child sequences and joins adjacent literals
+    flat = []
+    for child in children:
+        for item in (child.children if isinstance(child, Sequence) else [child]):
+            if isinstance(item, Literal) and flat and isinstance(flat[-1], Literal):
+                flat[-1] = Literal(flat[-1].char + item.char)
+            elif not (isinstance(item, Literal) and item.char == ''):
+                flat.append(item)
+    if not flat:
+        return Literal('')
+    return flat[0] if len(flat) == 1 else Sequence(flat)
+
+def flatten_choice(children, split_sets=False):
+    # the options of a choice with its child choices spliced in (and, with split_sets,
+    # its character sets as one literal per character). generate() gives each option
+    # an equal share, so to keep every string's odds each option is listed lcm / k
+    # times, where k is the number of options it stood among (1 for plain children).
+    # the repeats are the same node object. returns None if nothing was spliced or the
+    # result would have more than MAX_FLAT_CHOICE options.
+    def options(child):
+        if isinstance(child, Choice):
+            return child.children
+        if split_sets and isinstance(child, CharSet) and not child.negated:
+            return [Literal(c) for c in child.chars]
+        return [child]
+
+    widths = [len(options(child)) for child in children]
+    common = lcm(*widths)
+    if common == 1 or len(children) * common > MAX_FLAT_CHOICE:
+        return None
+    flat = []
+    for child, width in zip(children, widths):
+        flat += [option for option in options(child) for _ in range(common // width)]
+    return flat
+
+def as_charset(children):
+    # a CharSet with the same odds as a choice of these options, if there is one: the
+    # options must be distinct single characters (a repeat would change the odds)
+    chars = [child.char for child in children if isinstance(child, Literal) and len(child.char) == 1]
+    if len(chars) == len(children) and len(set(chars)) == len(chars):
+        return CharSet(''.join(chars))
+    return None
+
+def make_choice(children):
+    if len(children) == 1:
+        return children[0]
+    # sets of the same size that do not overlap, with or without single characters
+    # around them, make one bigger set; otherwise only the child choices are spliced
+    flat = flatten_choice(children, split_sets=True)
+    merged = as_charset(flat) if flat is not None else None
+    if merged is not None:
+        return merged
+    flat = flatten_choice(children)
+    if flat is not None:
+        children = flat
+    return as_charset(children) or Choice(children)
+
+def count_nodes(node, seen=None):
+    # the number of distinct nodes in an ast (a node shared by several parents counts once)
+    seen = set() if seen is None else seen
+    if id(node) in seen:
+        return 0
+    seen.add(id(node))
+    if isinstance(node, (Sequence, Choice)):
+        return 1 + sum(count_nodes(child, seen) for child in node.children)
+    if isinstance(node, Repeat):
+        return 1 + count_nodes(node.child, seen)
+    return 1
+
+# --- before and after on the lab patterns ---
+
+if __name__ == "__main__":
+    import random
+    import timeit
+    from collections import Counter
+    from Language import Language
+    from Main import variant3_patterns
+    from Sampler import chi_square_p
+
+    def frequencies(ast, n, seed):
+        random.seed(seed)
+        return Counter(ast.generate() for _ in range(n))
+
+    extra = ["((A|B)|(C|D))E", "(A|(B|C))+", "(X|X|Y)Z", "(AB)³C", "(AB|(C|D)|(E|FG))?"]
+    n = 200000
+    for pattern in variant3_patterns + extra:
+        ast = parse_regex(pattern)
+        optimized = optimize(ast)
+
+        # same language, and the same odds for every string
+        assert list(Language(optimized)) == list(Language(ast)), pattern
+        # (two-sample chi-square on the string counts of both trees)
+        before, after = frequencies(ast, n, 1), frequencies(optimized, n, 2)
+        strings = before.keys() | after.keys()
+        statistic = sum((before[s] - after[s]) ** 2 / (before[s] + after[s]) for s in strings)
+        p = chi_square_p(statistic, len(strings) - 1) if len(strings) > 1 else 1.0
+        assert p > 1e-4, (pattern, statistic, p)
+
+        # best of several alternating runs, as the timings are noisy
+        times = [float('inf'), float('inf')]
+        for _ in range(7):
+            for i, tree in enumerate((ast, optimized)):
+                times[i] = min(times[i], timeit.timeit(tree.generate, number=20000))
+        print(f"{pattern:<24} {count_nodes(ast):3d} -> {count_nodes(optimized):2d} nodes, "
+              f"generate() {times[0] / times[1]:.2f}x faster (p={p:.2f}): {optimized}")
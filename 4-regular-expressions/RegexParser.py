@@ -6,8 +6,9 @@ MAX_REPEATS = 5 # limit for '*' and '+' quantifiers
 
 class RegexNode:
     # base class for all regex components (nodes in the ast).
-    def generate(self, log=None):
-        # generates a random string matching this node.
+    def generate(self, trace=None):
+        # generates a random string matching this node, recording the steps in an
+        # optional GenerationTrace.
         raise NotImplementedError("generate() must be implemented by subclasses")
 
     def __str__(self):
@@ -19,32 +20,50 @@ class Literal(RegexNode):
     def __init__(self, char):
         self.char = char # e.g., 'a', 'b', '1'
 
-    def generate(self, log=None):
-        if log is not None:
-            log.append(f"-> appending literal '{self.char}'")
+    def generate(self, trace=None):
+        if trace is not None:
+            trace.record(self, LITERAL)
         return self.char
 
     def __str__(self):
         # represents the literal node itself
         return f"'{self.char}'"
 
+class CharSet(RegexNode):
+    # represents one character out of a set (or, negated, any character not in it).
+    PRINTABLE = [chr(c) for c in range(32, 127)] # pool used when generating from a negated set
+
+    def __init__(self, chars, negated=False):
+        self.chars = ''.join(sorted(set(chars))) # e.g., 'abc'
+        self.negated = negated
+        # the characters generate() picks from, worked out once
+        self.pool = ''.join(c for c in self.PRINTABLE if c not in self.chars) if negated else self.chars
+
+    def generate(self, trace=None):
+        char = random.choice(self.pool)
+        if trace is not None:
+            trace.record(self, PICK, char)
+        return char
+
+    def __str__(self):
+        return f"[{'^' if self.negated else ''}{self.chars}]"
+
 class Sequence(RegexNode):
     # represents a sequence of components executed one after another.
     def __init__(self, children):
         # children is a list of RegexNode instances.
         self.children = children
 
-    def generate(self, log=None):
-        result = ""
-        if log is not None:
-            log.append(f"-> entering sequence ({len(self.children)} items: {' '.join(map(str, self.children))})")
+    def generate(self, trace=None):
+        if trace is None:
+            return ''.join([child.generate() for child in self.children]) # generate each child in order
+        parts = []
+        trace.record(self, ENTER)
         for i, child in enumerate(self.children):
-            if log is not None:
-                log.append(f"  - sequence item {i+1}/{len(self.children)}: processing {child}")
-            result += child.generate(log) # generate each child in order
-        if log is not None:
-            log.append(f"<- exiting sequence")
-        return result
+            trace.record(self, ITEM, i)
+            parts.append(child.generate(trace))
+        trace.record(self, EXIT)
+        return ''.join(parts)
 
     def __str__(self):
         # represents the sequence structure
@@ -56,13 +75,14 @@ class Choice(RegexNode):
         # children is a list of RegexNode instances (the options).
         self.children = children
 
-    def generate(self, log=None):
-        chosen_child = random.choice(self.children) # pick one option randomly
-        if log is not None:
-            log.append(f"-> entering choice ({len(self.children)} options: {' | '.join(map(str, self.children))}): choosing {chosen_child}")
-        result = chosen_child.generate(log) # generate the chosen option
-        if log is not None:
-            log.append(f"<- exiting choice (result: '{result}')")
+    def generate(self, trace=None):
+        branch = random.randrange(len(self.children)) # pick one option randomly
+        chosen_child = self.children[branch]
+        if trace is None:
+            return chosen_child.generate()
+        trace.record(self, ENTER, branch) # the index, as a child may appear more than once
+        result = chosen_child.generate(trace) # generate the chosen option
+        trace.record(self, EXIT)
         return result
 
     def __str__(self):
@@ -86,23 +106,17 @@ class Repeat(RegexNode):
         # ensure min is not greater than potentially capped max
         self.min_rep = min(self.min_rep, self.max_rep)
 
-    def generate(self, log=None):
+    def generate(self, trace=None):
         num_repeats = random.randint(self.min_rep, self.max_rep)
-        result = ""
-        quantifier_str = self._get_quantifier_symbol() # get representation like '*' or '{2,5}'
-        if log is not None:
-            log.append(f"-> repeating {self.child} {quantifier_str}: generating {num_repeats} times (allowed range {self.min_rep}-{self.max_rep})")
-
-        if num_repeats == 0 and log is not None:
-            log.append(f"  - repeating 0 times, adding empty string.")
-
+        if trace is None:
+            return ''.join([self.child.generate() for _ in range(num_repeats)]) # generate the child n times
+        parts = []
+        trace.record(self, ENTER, num_repeats)
         for i in range(num_repeats):
-            if log is not None:
-                log.append(f"  - repetition {i+1}/{num_repeats}: generating instance of {self.child}")
-            result += self.child.generate(log) # generate the child n times
-        if log is not None:
-            log.append(f"<- finished repeating {self.child} (result: '{result}')")
-        return result
+            trace.record(self, ITEM, i)
+            parts.append(self.child.generate(trace))
+        trace.record(self, EXIT)
+        return ''.join(parts)
 
     def _get_quantifier_symbol(self):
         # uses original max rep to determine symbol before capping
@@ -116,6 +130,85 @@ class Repeat(RegexNode):
         # represent the repeat structure, e.g., ('A')* or (Choice('P' | 'Q' | 'R'))+
         return f"({self.child}){self._get_quantifier_symbol()}"
 
+# --- generation trace ---
+
+# event kinds; the detail of an event is the chosen branch (choice), the repeat
+# count (repeat), the item index (sequence or repetition item) or the picked char
+ENTER = 0
+ITEM = 1
+EXIT = 2
+LITERAL = 3
+PICK = 4
+
+class GenerationTrace:
+    # records generation steps as compact (node id, kind, detail) tuples. nothing is
+    # formatted while generating; render() builds the readable log on demand.
+    def __init__(self):
+        self.nodes = [] # node id -> node
+        self.ids = {} # id(node) -> node id
+        self.events = []
+
+    def record(self, node, kind, detail=None):
+        node_id = self.ids.get(id(node))
+        if node_id is None:
+            node_id = self.ids[id(node)] = len(self.nodes)
+            self.nodes.append(node)
+        self.events.append((node_id, kind, detail))
+
+    def __len__(self):
+        return len(self.events)
+
+    def render(self):
+        # yields (depth, message) per step. the generated text is replayed from the
+        # literal and pick events to report what each choice and repeat produced.
+        labels = {} # node id -> str(node), each subtree is formatted once
+        def label(node):
+            text = labels.get(id(node))
+            if text is None:
+                text = labels[id(node)] = str(node)
+            return text
+
+        output = []
+        open_nodes = [] # (output length at entry, repeat count) of each open choice or repeat
+        depth = 0
+        for node_id, kind, detail in self.events:
+            node = self.nodes[node_id]
+            if kind == LITERAL:
+                output.append(node.char)
+                yield depth, f"-> appending literal '{node.char}'"
+            elif kind == PICK:
+                output.append(detail)
+                yield depth, f"-> picking '{detail}' from {label(node)}"
+            elif isinstance(node, Sequence):
+                if kind == ENTER:
+                    yield depth, f"-> entering sequence ({len(node.children)} items: {' '.join(map(label, node.children))})"
+                    depth += 1
+                elif kind == ITEM:
+                    yield depth, f"  - sequence item {detail+1}/{len(node.children)}: processing {label(node.children[detail])}"
+                else:
+                    depth = max(depth - 1, 0)
+                    yield depth, "<- exiting sequence"
+            elif isinstance(node, Choice):
+                if kind == ENTER:
+                    open_nodes.append((len(output), None))
+                    yield depth, (f"-> entering choice ({len(node.children)} options: {' | '.join(map(label, node.children))}): "
+                                  f"choosing {label(node.children[detail])}")
+                    depth += 1
+                else:
+                    depth = max(depth - 1, 0)
+                    yield depth, f"<- exiting choice (result: '{''.join(output[open_nodes.pop()[0]:])}')"
+            else: # repeat
+                if kind == ENTER:
+                    open_nodes.append((len(output), detail))
+                    yield depth, (f"-> repeating {label(node.child)} {node._get_quantifier_symbol()}: generating {detail} times "
+                                  f"(allowed range {node.min_rep}-{node.max_rep})")
+                    if detail == 0:
+                        yield depth, "  - repeating 0 times, adding empty string."
+                elif kind == ITEM:
+                    yield depth, f"  - repetition {detail+1}/{open_nodes[-1][1]}: generating instance of {label(node.child)}"
+                else:
+                    yield depth, f"<- finished repeating {label(node.child)} (result: '{''.join(output[open_nodes.pop()[0]:])}')"
+
 # --- parser implementation ---
 
 class RegexParser:
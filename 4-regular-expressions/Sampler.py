@@ -0,0 +1,139 @@
+import math
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from Language import Language
+
+# draws strings uniformly from the bounded language of a pattern. generate() picks
+# choice branches and repeat counts uniformly, so strings behind few decisions come up
+# far more often than their share of the language; here every string is equally likely.
+
+class UniformSampler:
+    # the per-state, per-length string counts of a Language are turned once into
+    # cumulative tables. a draw picks one random index below the number of strings and
+    # decodes it along the dfa, one bisect per output character.
+    def __init__(self, pattern):
+        self.language = pattern if isinstance(pattern, Language) else Language(pattern)
+        language = self.language
+        # tables[state][remaining] = (bounds, steps): steps are (chars, target, strings
+        # after it) per move that can still finish, bounds their running string totals
+        self.tables = []
+        for state, moves in enumerate(language.moves):
+            per_length = [None]
+            for remaining in range(1, len(language.suffix[state])):
+                bounds = []
+                steps = []
+                total = 0
+                for cls, target in moves:
+                    counts = language.suffix[target]
+                    after = counts[remaining - 1] if remaining <= len(counts) else 0
+                    if after:
+                        chars = language.members[cls]
+                        total += len(chars) * after
+                        bounds.append(total)
+                        steps.append((chars, target, after))
+                per_length.append((bounds, steps))
+            self.tables.append(per_length)
+        self.length_bounds = list(accumulate(language.counts))
+
+    def string_at(self, length, index):
+        # string number index (0 <= index < count(length)) among those of that length,
+        # in the sampler's own order
+        tables = self.tables
+        state = 0
+        out = []
+        for remaining in range(length, 0, -1):
+            bounds, steps = tables[state][remaining]
+            i = bisect_right(bounds, index)
+            if i:
+                index -= bounds[i - 1]
+            chars, state, after = steps[i]
+            char, index = divmod(index, after)
+            out.append(chars[char])
+        return ''.join(out)
+
+    def sample(self, length=None, rng=random):
+        # one uniformly random string of the given length, or of the whole language
+        if length is None:
+            if not self.language.size:
+                raise ValueError("sampler error: the language is empty")
+            index = rng.randrange(self.language.size)
+            length = bisect_right(self.length_bounds, index)
+            if length:
+                index -= self.length_bounds[length - 1]
+        else:
+            strings = self.language.count(length)
+            if not strings:
+                raise ValueError(f"sampler error: no strings of length {length}")
+            index = rng.randrange(strings)
+        return self.string_at(length, index)
+
+    def sample_many(self, n, length=None, rng=random):
+        return [self.sample(length, rng) for _ in range(n)]
+
+# --- uniformity test ---
+
+def chi_square_uniform(samples, population):
+    # pearson's chi-square of the sample counts against a uniform distribution over
+    # population strings (strings never drawn count as zero). returns (statistic, p).
+    observed = {}
+    for s in samples:
+        observed[s] = observed.get(s, 0) + 1
+    expected = len(samples) / population
+    statistic = sum((n - expected) ** 2 for n in observed.values()) / expected
+    statistic += (population - len(observed)) * expected
+    return statistic, chi_square_p(statistic, population - 1)
+
+def chi_square_p(statistic, df):
+    # upper tail probability of a chi-square statistic with df degrees of freedom, by
+    # the wilson-hilferty normal approximation (fine for the large df used here). with
+    # no degrees of freedom (a single string) nothing can be non-uniform: p is 1
+    if df <= 0:
+        return 1.0
+    z = ((statistic / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def uniformity_test(sampler, draws_per_string=50, length=None, rng=random):
+    # samples draws_per_string times the number of strings (of one length, or all of
+    # them) and returns (statistic, p, invalid); a small p means the draws are not
+    # uniform. invalid counts the draws of the wrong length or outside the bounded dfa,
+    # which should be 0.
+    language = sampler.language
+    population = language.size if length is None else language.count(length)
+    samples = sampler.sample_many(population * draws_per_string, length, rng)
+    dfa = language.dfa
+    invalid = sum(1 for s in samples if (length is not None and len(s) != length) or not dfa.matches(s))
+    return chi_square_uniform(samples, population) + (invalid,)
+
+# --- self-check on the lab patterns ---
+
+if __name__ == "__main__":
+    import time
+    from Main import variant3_patterns
+
+    rng = random.Random(0)
+    for pattern in variant3_patterns:
+        sampler = UniformSampler(pattern)
+        language = sampler.language
+        # the longest pattern has 29120 strings; test it on one length
+        length = None if language.size < 5000 else 10
+        population = language.size if length is None else language.count(length)
+        statistic, p, invalid = uniformity_test(sampler, length=length, rng=rng)
+        assert p > 1e-4 and not invalid, (pattern, statistic, p, invalid)
+
+        # the same test on generate() output, for contrast
+        random.seed(0)
+        generated = []
+        while len(generated) < population * 50:
+            s = language.ast.generate()
+            if length is None or len(s) == length:
+                generated.append(s)
+        _, generate_p = chi_square_uniform(generated, population)
+
+        n = 100000
+        start = time.perf_counter()
+        sampler.sample_many(n, rng=rng)
+        rate = n / (time.perf_counter() - start)
+        scope = "all lengths" if length is None else f"length {length}"
+        print(f"{pattern:<24} {population:>5} strings ({scope}): chi-square p={p:.3f}, "
+              f"generate() p={generate_p:.1e}, {rate:,.0f} samples/sec")
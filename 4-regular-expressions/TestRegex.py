@@ -0,0 +1,171 @@
+import os
+import random
+import re
+import tempfile
+import unittest
+from collections import Counter
+from Automaton import compile_regex
+from Bulk import bulk_generate
+from Generator import generate_many
+from Language import Language
+from LexerGenerator import DFALexer, MUSIC_SPECS
+from Main import variant3_patterns
+from Optimizer import count_nodes, optimize
+from RegexParser import ENTER, CharSet, Choice, GenerationTrace, Literal, Repeat, parse_regex
+from Sampler import UniformSampler, uniformity_test
+from VectorGenerator import np, generate_arrays, to_strings, write_lines
+from Weights import choice_table, find_nodes, geometric
+
+def python_regex(pattern):
+    # the same pattern in python's re syntax, as an independent reference
+    return re.compile(pattern.replace('²', '{2}').replace('³', '{3}'))
+
+class RegexTest(unittest.TestCase):
+    def test_dfa_lexer(self):
+        lexer = DFALexer(MUSIC_SPECS)
+        tokens = list(lexer.tokenize("|: c 4. d# // x\nmf $"))
+        self.assertEqual([(t, v) for t, v, _ in tokens],
+                         [('REPEAT_START', '|:'), ('NOTE', 'c'), ('DURATION', '4.'), ('NOTE', 'd'),
+                          ('SHARP', '#'), ('DYNAMIC', 'mf'), ('ERROR', '$')])
+        self.assertEqual(tokens[-1][2], 19)
+
+    def test_dfa_matches_generated_strings(self):
+        random.seed(0)
+        for pattern in variant3_patterns:
+            ast = parse_regex(pattern)
+            dfa = compile_regex(ast)
+            reference = python_regex(pattern)
+            for _ in range(500):
+                s = ast.generate()
+                self.assertTrue(dfa.matches(s), s)
+                # a near miss agrees with python's re
+                miss = s[:-1] + 'Z'
+                self.assertEqual(dfa.matches(miss), bool(reference.fullmatch(miss)), miss)
+
+    def test_generate_many_matches(self):
+        for pattern in variant3_patterns:
+            dfa = compile_regex(pattern)
+            self.assertTrue(all(dfa.matches(s) for s in generate_many(pattern, 2000, random.Random(1))))
+
+    def test_trace_render(self):
+        random.seed(3)
+        trace = GenerationTrace()
+        result = parse_regex("A(B|C)+").generate(trace)
+        steps = list(trace.render())
+        self.assertEqual(steps[0], (0, "-> entering sequence (2 items: 'A' (Choice('B' | 'C'))+)"))
+        self.assertEqual(steps[-1], (0, "<- exiting sequence"))
+        self.assertIn(f"result: '{result[1:]}'", steps[-2][1])
+        # a child listed twice, as flatten_choice does, is reported by its own index
+        x = Literal('X')
+        trace = GenerationTrace()
+        for _ in range(30):
+            Choice([x, Literal('Y'), x]).generate(trace)
+        self.assertEqual({detail for _, kind, detail in trace.events if kind == ENTER}, {0, 1, 2})
+
+    def test_language_counts_ambiguous_patterns(self):
+        # counting derivations would give 2 and 36
+        self.assertEqual(Language("(A|A)").size, 1)
+        language = Language("A*A*")
+        self.assertEqual(language.size, 11)
+        self.assertEqual(list(language), ['A' * n for n in range(11)])
+        language = Language(variant3_patterns[0])
+        self.assertEqual(language.size, 726)
+        self.assertEqual(language.counts, [0, 0, 0, 0, 6, 18, 54, 162, 486])
+        strings = list(language)
+        self.assertEqual(strings, sorted(set(strings), key=lambda s: (len(s), s)))
+
+    def test_language_long_pattern(self):
+        # counting and enumeration do not recurse per character
+        language = Language("A" * 1500 + "B?")
+        self.assertEqual(language.size, 2)
+        self.assertEqual(list(language), ["A" * 1500, "A" * 1500 + "B"])
+        self.assertEqual(Language(optimize(parse_regex("(AB)" * 800))).max_length, 1600)
+
+    def test_sampler_uniformity(self):
+        rng = random.Random(0)
+        sampler = UniformSampler(variant3_patterns[1])
+        statistic, p, invalid = uniformity_test(sampler, draws_per_string=40, rng=rng)
+        self.assertGreater(p, 1e-4)
+        self.assertEqual(invalid, 0)
+        sampler = UniformSampler(variant3_patterns[2])
+        self.assertTrue(all(len(s) == 7 for s in sampler.sample_many(200, length=7, rng=rng)))
+        with self.assertRaises(ValueError):
+            sampler.sample(length=2)
+
+    def test_sampler_single_string(self):
+        self.assertEqual(uniformity_test(UniformSampler("A"), draws_per_string=5)[1], 1.0)
+        self.assertEqual(uniformity_test(UniformSampler("AB?"), draws_per_string=5, length=1), (0.0, 1.0, 0))
+
+    def test_weights(self):
+        ast = parse_regex("(GET|POST)/(a|b)+")
+        method = find_nodes(ast, Choice)[0]
+        path = find_nodes(ast, Repeat)[0]
+        weights = {method: [9, 1], path: geometric(path, 0.5)}
+        strings = generate_many(ast, 20000, random.Random(2), weights)
+        methods = Counter(s.split('/')[0] for s in strings)
+        self.assertAlmostEqual(methods['GET'] / 20000, 0.9, delta=0.01)
+        lengths = Counter(len(s.split('/')[1]) for s in strings)
+        self.assertAlmostEqual(lengths[1] / 20000, 0.5 / sum(weights[path].values()), delta=0.015)
+        self.assertFalse(set(lengths) - {1, 2, 3, 4, 5})
+        with self.assertRaises(ValueError):
+            generate_many(ast, 1, weights={method: [1, 2, 3]})
+
+    def test_charset_weights(self):
+        # one weight per character of the pool, in order
+        ast = optimize(parse_regex("(a|b|c)+")) # the choice becomes a CharSet
+        chars = find_nodes(ast, CharSet)[0]
+        weights = {chars: [8, 1, 1]}
+        letters = Counter(''.join(generate_many(ast, 5000, random.Random(5), weights)))
+        self.assertAlmostEqual(letters['a'] / sum(letters.values()), 0.8, delta=0.02)
+        if np is not None:
+            data, offsets = generate_arrays(ast, 5000, rng=5, weights=weights)
+            letters = Counter(''.join(to_strings(data, offsets)))
+            self.assertAlmostEqual(letters['a'] / sum(letters.values()), 0.8, delta=0.02)
+        with self.assertRaises(ValueError):
+            generate_many(ast, 1, weights={chars: [1, 2]})
+        with self.assertRaises(ValueError):
+            choice_table(find_nodes(ast, Repeat)[0], [1])
+
+    def test_bulk_reproducible(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outputs = []
+            for processes in (1, 2):
+                path = os.path.join(directory, f"out{processes}.txt")
+                bulk_generate(variant3_patterns[2], 5000, path, seed=4, shards=3, processes=processes)
+                with open(path, encoding='utf-8') as f:
+                    outputs.append(f.read())
+            self.assertEqual(outputs[0], outputs[1])
+            lines = outputs[0].split('\n')
+            self.assertEqual(lines.pop(), '')
+            self.assertEqual(len(lines), 5000)
+            dfa = compile_regex(variant3_patterns[2])
+            self.assertTrue(all(dfa.matches(line) for line in lines))
+            self.assertFalse([name for name in os.listdir(directory) if '.part' in name])
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_vector_generator(self):
+        for pattern in variant3_patterns:
+            dfa = compile_regex(pattern)
+            data, offsets = generate_arrays(pattern, 5000, rng=0)
+            self.assertEqual(len(offsets), 5001)
+            strings = to_strings(data, offsets)
+            self.assertTrue(all(dfa.matches(s) for s in strings))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "out.txt")
+            write_lines("A(B|C)é", 100, path, rng=1, batch=30)
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().split('\n')
+            self.assertEqual(lines.pop(), '')
+            self.assertEqual(sorted(set(lines)), ['ABé', 'ACé'])
+            self.assertEqual(len(lines), 100)
+
+    def test_optimizer_keeps_language(self):
+        for pattern in variant3_patterns + ["((A|B)|(C|D))E", "(A|(B|C))+", "(X|X|Y)Z", "(AB)³C"]:
+            ast = parse_regex(pattern)
+            optimized = optimize(ast)
+            self.assertEqual(list(Language(optimized)), list(Language(ast)), pattern)
+            self.assertLessEqual(count_nodes(optimized), count_nodes(ast))
+        self.assertEqual(str(optimize(parse_regex("((A|B)|(C|D))E"))), "Seq([ABCD], 'E')")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+from RegexParser import CharSet, Choice, Repeat, Sequence
+
+# weighted generation: a side table maps Choice nodes to branch weights, CharSet nodes
+# to one weight per character of their pool and Repeat nodes to a distribution of
+# repeat counts. compile_program turns each entry into a walker alias table, so a
+# weighted draw takes one random number and one comparison however many alternatives
+# there are.
+#
+#     ast = parse_regex("(GET|POST|PUT|DELETE) /(a|b)+")
+#     method, path = find_nodes(ast, Choice)[0], find_nodes(ast, Repeat)[0]
+#     weights = {method: [70, 20, 7, 3], path: geometric(path, 0.5)}
+#     generate_many(ast, 1000, weights=weights)
+
+def find_nodes(node, kind=None):
+    # the nodes of an ast in preorder (optionally only those of one class), for
+    # picking out the ones to weight
+    found = [node] if kind is None or isinstance(node, kind) else []
+    if isinstance(node, (Sequence, Choice)):
+        for child in node.children:
+            found += find_nodes(child, kind)
+    elif isinstance(node, Repeat):
+        found += find_nodes(node.child, kind)
+    return found
+
+def alias_table(weights):
+    # vose's alias method: returns (prob, alias). to draw, take x = uniform() * n and
+    # i = int(x); the result is i if x - i < prob[i], else alias[i].
+    n = len(weights)
+    total = sum(weights)
+    if not n or total <= 0 or min(weights) < 0:
+        raise ValueError(f"weights error: need non-negative weights with a positive sum, got {weights}")
+    scaled = [w * n / total for w in weights]
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] += scaled[less] - 1
+        (small if scaled[more] < 1 else large).append(more)
+    # whatever is left is 1 up to rounding and keeps prob 1
+    return prob, alias
+
+def geometric(node, p):
+    # repeat counts of a Repeat node falling off geometrically: count min_rep + k has
+    # weight p * (1 - p) ** k, truncated at max_rep
+    if not 0 < p <= 1:
+        raise ValueError(f"weights error: geometric p must be in (0, 1], got {p}")
+    return {count: p * (1 - p) ** (count - node.min_rep) for count in range(node.min_rep, node.max_rep + 1)}
+
+def repeat_table(node, histogram):
+    # (low, span, (prob, alias)) for a {count: weight} histogram of a Repeat node;
+    # the counts must lie within what the node can generate
+    if not histogram:
+        raise ValueError(f"weights error: empty histogram for {node}")
+    low, high = min(histogram), max(histogram)
+    if low < node.min_rep or high > node.max_rep:
+        raise ValueError(f"weights error: counts {low}-{high} outside {node.min_rep}-{node.max_rep} for {node}")
+    return low, high - low + 1, alias_table([histogram.get(count, 0) for count in range(low, high + 1)])
+
+def choice_table(node, weights):
+    # the options of a Choice are its branches, those of a CharSet the characters of its
+    # pool in order (for a negated set, the printable characters it leaves)
+    if isinstance(node, CharSet):
+        options = node.pool
+    elif isinstance(node, Choice):
+        options = node.children
+    else:
+        raise ValueError(f"weights error: {node} has no options to weight")
+    if len(weights) != len(options):
+        raise ValueError(f"weights error: {len(weights)} weights for {len(options)} options of {node}")
+    return alias_table(weights)
+
+# --- weighted generation check ---
+
+if __name__ == "__main__":
+    import random
+    import time
+    from collections import Counter
+    from Automaton import compile_regex
+    from Generator import generate_many
+    from RegexParser import parse_regex
+
+    rng = random.Random(0)
+
+    # empirical frequencies follow the weights
+    ast = parse_regex("(GET|POST|PUT|DELETE) /(a|b)+")
+    method = find_nodes(ast, Choice)[0]
+    path = find_nodes(ast, Repeat)[0]
+    weights = {method: [70, 20, 7, 3], path: geometric(path, 0.5)}
+    n = 200000
+    strings = generate_many(ast, n, rng, weights)
+    dfa = compile_regex(ast)
+    assert all(dfa.matches(s) for s in strings)
+    methods = Counter(s.split(' ')[0] for s in strings)
+    for name, weight in zip(["GET", "POST", "PUT", "DELETE"], weights[method]):
+        assert abs(methods[name] / n - weight / 100) < 0.005, (name, methods[name])
+    lengths = Counter(len(s.split('/')[1]) for s in strings)
+    total = sum(weights[path].values())
+    for count, weight in weights[path].items():
+        assert abs(lengths[count] / n - weight / total) < 0.005, (count, lengths[count])
+    print("mix:", ", ".join(f"{name} {methods[name] / n:.1%}" for name in ["GET", "POST", "PUT", "DELETE"]),
+          "| path lengths:", ", ".join(f"{count} {lengths[count] / n:.1%}" for count in sorted(lengths)))
+
+    # a draw costs the same for 2 or 200 alternatives
+    for width in (2, 20, 200):
+        pattern = "(" + "|".join(f"x{i}" for i in range(width)) + ")+"
+        ast = parse_regex(pattern)
+        choice = find_nodes(ast, Choice)[0]
+        weights = {choice: [1 + i % 7 for i in range(width)]}
+        start = time.perf_counter()
+        generate_many(ast, n, rng)
+        uniform_time = time.perf_counter() - start
+        start = time.perf_counter()
+        generate_many(ast, n, rng, weights)
+        weighted_time = time.perf_counter() - start
+        print(f"{width:>3} options: uniform {n / uniform_time:,.0f}/s, weighted {n / weighted_time:,.0f}/s")